@@ -1,29 +1,34 @@
-from .prompt_translate_node import PromptTranslateNode
+from .prompt_translate_node import PromptTranslateNode, PromptBatchTranslateNode
 from .txt_loader_node import TXTLoaderNode
 from .text_merge_node import TextMergeNode
 from .numeric_calculator_node import NumericCalculatorNode
 from .multiple_modifier_node import MultipleModifierNode
 from .any_selector_node import AnySelectorNode
 from .video_frame_extract_node import VideoFrameExtractNode
+from .video_folder_extract_node import VideoFolderFrameExtractNode
 
 NODE_CLASS_MAPPINGS = {
     "PromptTranslateNode": PromptTranslateNode,
+    "PromptBatchTranslateNode": PromptBatchTranslateNode,
     "TXTLoaderNode": TXTLoaderNode,
     "TextMergeNode": TextMergeNode,
     "NumericCalculatorNode": NumericCalculatorNode,
     "MultipleModifierNode": MultipleModifierNode,
     "AnySelectorNode": AnySelectorNode,
-    "VideoFrameExtractNode": VideoFrameExtractNode
+    "VideoFrameExtractNode": VideoFrameExtractNode,
+    "VideoFolderFrameExtractNode": VideoFolderFrameExtractNode
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "PromptTranslateNode": "提示词翻译",
+    "PromptBatchTranslateNode": "提示词批量翻译",
     "TXTLoaderNode": "TXT文件批量加载",
     "TextMergeNode": "文本合并",
     "NumericCalculatorNode": "数值计算器",
     "MultipleModifierNode": "倍数修改器",
     "AnySelectorNode": "任意选择器",
-    "VideoFrameExtractNode": "视频首尾帧获取"
+    "VideoFrameExtractNode": "视频首尾帧获取",
+    "VideoFolderFrameExtractNode": "视频文件夹首尾帧批量获取"
 }
 
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS']
@@ -0,0 +1,167 @@
+"""
+👻幻影工具 - 视频帧格式转换
+BGR→RGB与归一化一次完成，直接写入预分配的[B,H,W,3]缓冲区，整批转换，无中间临时数组
+缩小输出（最长边/缩放比例）在uint8帧上以INTER_AREA完成后再归一化，内存与耗时随输出尺寸缩放
+支持输出精度：float32（ComfyUI标准IMAGE）/ float16 / uint8（原始像素值）
+直接运行本文件可对比旧转换流程的峰值内存与耗时：python frame_convert.py
+"""
+import time
+import tracemalloc
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+OUTPUT_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "uint8": np.uint8,
+}
+_TORCH_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "uint8": torch.uint8,
+}
+_MAX_255 = np.float32(255.0)
+
+
+def allocate_image_batch(batch: int, height: int, width: int, dtype_name: str = "float32",
+                         out: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """分配[B,H,W,3]输出缓冲区；out形状与精度匹配时直接复用"""
+    if (out is not None and tuple(out.shape) == (batch, height, width, 3)
+            and out.dtype == _TORCH_DTYPES[dtype_name] and out.is_contiguous() and out.device.type == "cpu"):
+        return out
+    # 经numpy分配再零拷贝包装，便于与numpy原地运算共享同一块内存
+    return torch.from_numpy(np.empty((batch, height, width, 3), dtype=OUTPUT_DTYPES[dtype_name]))
+
+
+def target_size(height: int, width: int, max_side: int = 0, scale: float = 1.0) -> Tuple[int, int]:
+    """计算缩小后的输出尺寸(高,宽)：只缩小不放大，最长边限制与缩放比例同时设置时取更小的结果"""
+    ratio = scale if 0 < scale < 1 else 1.0
+    if max_side > 0 and max(height, width) * ratio > max_side:
+        ratio = max_side / max(height, width)
+    if ratio >= 1.0:
+        return height, width
+    return max(1, int(round(height * ratio))), max(1, int(round(width * ratio)))
+
+
+def resize_frame(frame: np.ndarray, max_side: int = 0, scale: float = 1.0) -> np.ndarray:
+    """在原始像素帧（uint8）上按面积插值缩小，尺寸不变时原样返回"""
+    height, width = frame.shape[:2]
+    out_height, out_width = target_size(height, width, max_side, scale)
+    if (out_height, out_width) == (height, width):
+        return frame
+    return cv2.resize(frame, (out_width, out_height), interpolation=cv2.INTER_AREA)
+
+
+def _rgb_view(frame: np.ndarray, bgr: bool) -> np.ndarray:
+    """返回RGB排列的视图（不复制）：BGR/BGRA反转通道，灰度图扩展出通道维度供广播"""
+    if frame.ndim == 2:
+        return frame[..., None]
+    if frame.shape[-1] == 1:
+        return frame
+    if bgr:
+        return frame[..., 2::-1]
+    return frame[..., :3]
+
+
+def frames_to_image(frames: Sequence[np.ndarray], dtype_name: str = "float32", bgr: bool = True,
+                    out: Optional[torch.Tensor] = None, max_side: int = 0, scale: float = 1.0) -> torch.Tensor:
+    """一批帧转换为ComfyUI IMAGE张量[B,H,W,3]
+
+    通道反转以视图完成，归一化由numpy ufunc直接写入输出缓冲区（float精度下除以255，与旧流程结果逐位一致），
+    每帧不再产生cvtColor/astype/除法三份整帧临时数组。传入out可复用同形状缓冲区
+    （注意：复用会覆盖上一次结果，仅适用于调用方确定旧结果已不再使用的场景）。
+    设置max_side/scale时先在原始像素帧上缩小，输出缓冲区按缩小后的尺寸分配。
+    """
+    if len(frames) == 0 or frames[0] is None or frames[0].size == 0:
+        raise Exception("无法获取有效帧数据")
+    first_frame = resize_frame(frames[0], max_side, scale)
+    height, width = first_frame.shape[:2]
+    result = allocate_image_batch(len(frames), height, width, dtype_name, out)
+    result_np = result.numpy()
+    for idx, frame in enumerate(frames):
+        if frame is None or frame.size == 0:
+            raise Exception("无法获取有效帧数据")
+        frame = first_frame if idx == 0 else resize_frame(frame, max_side, scale)
+        if frame.shape[:2] != (height, width):
+            raise Exception(f"帧尺寸不一致：{frame.shape[:2]} ≠ {(height, width)}")
+        src = _rgb_view(frame, bgr)
+        if dtype_name == "uint8":
+            np.copyto(result_np[idx], src, casting="unsafe")
+        else:
+            # 以float32精度计算（分块缓冲，不产生整帧临时数组），结果直接写入输出
+            np.divide(src, _MAX_255, out=result_np[idx], dtype=np.float32, casting="unsafe")
+    return result
+
+
+def select_tensor_frames(frames: torch.Tensor, frame_indices: Sequence[int]) -> torch.Tensor:
+    """按帧序号选取[N,H,W,C]张量中的帧：序号为等差递增时以切片返回视图（零拷贝），否则仅复制选中帧"""
+    if len(frame_indices) == 1:
+        return frames[frame_indices[0]:frame_indices[0] + 1]
+    step = frame_indices[1] - frame_indices[0]
+    if step > 0 and all(b - a == step for a, b in zip(frame_indices, frame_indices[1:])):
+        return frames[frame_indices[0]:frame_indices[-1] + 1:step]
+    return frames[torch.as_tensor(list(frame_indices), dtype=torch.long, device=frames.device)]
+
+
+def tensor_to_image(frames: torch.Tensor, dtype_name: str = "float32", max_side: int = 0, scale: float = 1.0) -> torch.Tensor:
+    """[B,H,W,C]张量转ComfyUI IMAGE
+
+    浮点张量视为ComfyUI IMAGE格式（RGB/0-1），精度一致且无需缩小时原样返回（零拷贝），不做颜色转换与归一化；
+    整型张量视为cv2像素帧（BGR/0-255），仅对传入的帧做融合转换。
+    """
+    if frames.is_floating_point():
+        out_height, out_width = target_size(frames.shape[1], frames.shape[2], max_side, scale)
+        if (out_height, out_width) != tuple(frames.shape[1:3]):
+            src = frames if frames.dtype in (torch.float32, torch.float64) else frames.float()
+            frames = F.interpolate(src.permute(0, 3, 1, 2), size=(out_height, out_width),
+                                   mode="area").permute(0, 2, 3, 1).contiguous()
+        target_dtype = _TORCH_DTYPES[dtype_name]
+        if frames.dtype == target_dtype:
+            return frames
+        if dtype_name == "uint8":
+            return (frames * 255.0).round_().clamp_(0, 255).to(torch.uint8)
+        return frames.to(target_dtype)
+    return frames_to_image(list(frames.cpu().numpy()), dtype_name, max_side=max_side, scale=scale)
+
+
+def _legacy_convert(frame: np.ndarray) -> torch.Tensor:
+    """旧转换流程（仅用于基准对比）：cvtColor → astype → /255 → expand_dims"""
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    frame_norm = frame_rgb.astype(np.float32) / 255.0
+    return torch.from_numpy(np.expand_dims(frame_norm, axis=0))
+
+
+def benchmark_conversion(height: int = 2160, width: int = 3840, batch: int = 2, repeat: int = 5):
+    """微基准：对比旧流程与融合转换的峰值内存分配（tracemalloc）与耗时"""
+    frames = [np.random.randint(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(batch)]
+
+    def measure(name, convert):
+        convert()  # 预热
+        tracemalloc.start()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = convert()
+            del result
+        elapsed = (time.perf_counter() - start) / repeat
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<16} 峰值内存：{peak / 2**20:8.1f}MB | 单次耗时：{elapsed * 1000:7.1f}ms")
+        return peak
+
+    output_mb = batch * height * width * 3 * 4 / 2**20
+    print(f"基准：{batch}帧 {width}x{height} BGR uint8 → [B,H,W,3]（float32输出本身占{output_mb:.1f}MB）")
+    legacy_peak = measure("旧流程 float32", lambda: torch.cat([_legacy_convert(f) for f in frames], dim=0))
+    fused_peak = measure("融合 float32", lambda: frames_to_image(frames, "float32"))
+    measure("融合 float16", lambda: frames_to_image(frames, "float16"))
+    measure("融合 uint8", lambda: frames_to_image(frames, "uint8"))
+    reuse_buffer = frames_to_image(frames, "float32")
+    measure("融合 float32复用", lambda: frames_to_image(frames, "float32", out=reuse_buffer))
+    print(f"float32峰值内存降低：{(1 - fused_peak / legacy_peak):.0%}")
+
+
+if __name__ == "__main__":
+    benchmark_conversion()
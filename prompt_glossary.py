@@ -0,0 +1,239 @@
+"""
+👻幻影工具 - 提示词词表
+用户词表（插件models目录下 glossary*.tsv / glossary*.json，中文→英文）构建Aho-Corasick自动机，一次扫描匹配全部词条：
+完全被词表覆盖的提示词直接查表翻译，不经过翻译模型；部分覆盖时只把未覆盖的片段交给模型。词表文件变化后自动重新加载
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from .prompt_segments import needs_translation
+from .prompt_syntax import split_edges
+
+logger = logging.getLogger(__name__)
+
+# 词表文件名匹配规则（放在插件models目录）
+GLOSSARY_FILE_PATTERN = re.compile(r"^glossary.*\.(tsv|json)$", re.IGNORECASE)
+
+# 词条之间的标点按目标语言转换
+_TO_EN_PUNCT = {"，": ", ", "、": ", ", "。": ". ", "；": "; ", "：": ": ", "！": "! ", "？": "? "}
+_TO_ZH_PUNCT = {",": "，", ";": "；", ":": "：", "!": "！", "?": "？"}
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def _get_model_dir() -> str:
+    plugin_root = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(plugin_root, "models")
+
+
+def convert_punctuation(text: str, tgt: str) -> str:
+    """不含源语言文字的间隔（标点、空白、数字）按目标语言转换标点：译为英文时全角转半角，译为中文时半角转全角"""
+    if tgt == "en":
+        for zh_punct, en_punct in _TO_EN_PUNCT.items():
+            text = text.replace(zh_punct, en_punct)
+        return re.sub(r" {2,}", " ", text)
+    text = re.sub(r"\s*([,;:!?])\s*", lambda m: _TO_ZH_PUNCT[m.group(1)], text)
+    return text.strip(" ") if text.strip() else ""
+
+
+class PhraseMatcher:
+    """Aho-Corasick自动机：一次扫描文本找出所有词条的全部出现位置"""
+
+    def __init__(self, phrases: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]  # 状态 -> 在此结束的词条长度
+        for phrase in phrases:
+            state = 0
+            for char in phrase:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(len(phrase))
+        # 广度优先建立失败指针，并合并后缀状态的输出
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int]]:
+        """所有匹配的(起点, 终点)"""
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length in self._output[state]:
+                matches.append((i + 1 - length, i + 1))
+        return matches
+
+
+class PromptGlossary:
+    """提示词词表：按翻译方向各建一个自动机，文件修改时间变化后自动重新加载，并统计覆盖率"""
+
+    def __init__(self, model_dir: str):
+        self.model_dir = model_dir
+        self.version = ""  # 词表内容哈希（参与翻译缓存键），无词表时为空
+        self._signature = None  # [(文件名, 修改时间, 大小)]
+        self._tables: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._matchers: Dict[Tuple[str, str], PhraseMatcher] = {}
+        self._lock = threading.Lock()
+        self.stats = {"full": 0, "partial": 0, "uncovered": 0, "covered_chars": 0, "total_chars": 0}
+
+    def _glossary_files(self) -> List[str]:
+        try:
+            names = sorted(name for name in os.listdir(self.model_dir) if GLOSSARY_FILE_PATTERN.match(name))
+        except OSError:
+            return []
+        return [os.path.join(self.model_dir, name) for name in names]
+
+    @staticmethod
+    def _read_entries(file_path: str) -> List[Tuple[str, str]]:
+        """读取词条：TSV每行「中文<TAB>英文」（#开头为注释）；JSON为{中文: 英文}或[[中文, 英文], …]"""
+        with open(file_path, "r", encoding="utf-8-sig") as f:
+            if file_path.lower().endswith(".json"):
+                data = json.load(f)
+                pairs = data.items() if isinstance(data, dict) else data
+                return [(str(zh), str(en)) for zh, en in pairs]
+            entries = []
+            for line in f:
+                if line.startswith("#") or "\t" not in line:
+                    continue
+                zh, en = line.rstrip("\r\n").split("\t")[:2]
+                entries.append((zh, en))
+            return entries
+
+    def refresh(self):
+        """词表文件有增删或修改时重新加载（只比较文件名、修改时间与大小，未变化时开销极小）"""
+        files = self._glossary_files()
+        signature = []
+        for file_path in files:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            signature.append((file_path, stat.st_mtime_ns, stat.st_size))
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            zh_en, en_zh = {}, {}
+            digest = hashlib.sha1()
+            for file_path, _, _ in signature:
+                try:
+                    entries = self._read_entries(file_path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ 词表读取失败：{file_path}（{str(e)}）")
+                    continue
+                for zh, en in entries:
+                    zh, en = zh.strip(), en.strip()
+                    if not zh or not en:
+                        continue
+                    zh_en.setdefault(zh, en)
+                    en_zh.setdefault(en.translate(_ASCII_LOWER), zh)
+                    digest.update(f"{zh}\t{en}\n".encode("utf-8"))
+            self._tables = {("zh", "en"): zh_en, ("en", "zh"): en_zh}
+            self._matchers = {direction: PhraseMatcher(list(table)) for direction, table in self._tables.items() if table}
+            self.version = digest.hexdigest() if zh_en else ""
+            self._signature = signature
+            if zh_en:
+                logger.info(f"✅ 词表已加载：{len(zh_en)}条（{len(signature)}个文件）")
+
+    def _select_matches(self, text: str, src: str) -> List[Tuple[int, int]]:
+        """最左最长、互不重叠的匹配；英文词条要求两端为单词边界"""
+        matcher = self._matchers.get((src, "zh" if src == "en" else "en"))
+        if matcher is None:
+            return []
+        matches = matcher.find_all(text)
+        if src == "en":
+            matches = [
+                (start, end) for start, end in matches
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+            ]
+        matches.sort(key=lambda m: (m[0], m[0] - m[1]))
+        selected = []
+        last_end = 0
+        for start, end in matches:
+            if start >= last_end:
+                selected.append((start, end))
+                last_end = end
+        return selected
+
+    def plan(self, text: str, src: str, tgt: str) -> List[Tuple[str, Optional[str]]]:
+        """切分为[(原文片段, 译文)]：词表命中的片段及不含源语言文字的间隔已有译文，需模型翻译的片段译文为None；
+        无词表或无命中时返回[(原文, None)]"""
+        self.refresh()
+        lookup_text = text.translate(_ASCII_LOWER) if src == "en" else text
+        selected = self._select_matches(lookup_text, src)
+        table = self._tables.get((src, tgt), {})
+
+        parts = []
+        covered = 0
+        position = 0
+        for start, end in selected + [(len(text), len(text))]:
+            gap = text[position:start]
+            if gap:
+                lead, core, trail = split_edges(gap)
+                if core and needs_translation(core, src):
+                    if lead:
+                        parts.append((lead, convert_punctuation(lead, tgt)))
+                    parts.append((core, None))
+                    if trail:
+                        parts.append((trail, convert_punctuation(trail, tgt)))
+                else:
+                    parts.append((gap, convert_punctuation(gap, tgt)))
+            if end > start:
+                parts.append((text[start:end], table[lookup_text[start:end]]))
+                covered += end - start
+            position = end
+
+        with self._lock:
+            self.stats["total_chars"] += len(text)
+            self.stats["covered_chars"] += covered
+            if not covered:
+                self.stats["uncovered"] += 1
+            elif any(translation is None for _, translation in parts):
+                self.stats["partial"] += 1
+            else:
+                self.stats["full"] += 1
+        if not covered:
+            return [(text, None)]
+        return parts
+
+    @staticmethod
+    def join(pieces: List[str], tgt: str) -> str:
+        """拼接译文片段：英文相邻单词之间补空格"""
+        result = ""
+        for piece in pieces:
+            if tgt == "en" and result and piece and result[-1].isalnum() and piece[0].isalnum():
+                result += " "
+            result += piece
+        return result.strip(" ") if tgt == "en" else result
+
+    def format_stats(self) -> str:
+        s = self.stats
+        coverage = s["covered_chars"] / s["total_chars"] if s["total_chars"] else 0.0
+        return (f"字符覆盖率{coverage:.0%} | 完全覆盖{s['full']}/部分覆盖{s['partial']}/未覆盖{s['uncovered']}"
+                f" | 词条{len(self._tables.get(('zh', 'en'), {}))}条")
+
+
+# 进程级共享词表
+GLOSSARY = PromptGlossary(_get_model_dir())
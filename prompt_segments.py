@@ -0,0 +1,130 @@
+"""
+👻幻影工具 - 提示词分段
+按逗号/顿号/分号/换行把提示词切分为标签片段，记录原分隔符，翻译后按原顺序与原分隔符拼回
+长提示词分块：按行、再按句末标点/逗号/空白切成有界长度的块，批量翻译后保持原行结构拼回
+规则分句：按句末标点、逗号切分句子，替代argostranslate的Stanza神经分句
+"""
+import os
+import re
+from typing import List, Tuple
+
+# 分隔符连同两侧空白一起保留，拼回时原样还原
+SEPARATOR_PATTERN = re.compile(r"(\s*[,，、;；\n]\s*)")
+_CJK_PATTERN = re.compile(r"[一-鿿]")
+_LATIN_PATTERN = re.compile(r"[A-Za-z]")
+
+
+def split_segments(text: str) -> Tuple[List[str], List[str]]:
+    """切分为(片段列表, 分隔符列表)，len(分隔符) == len(片段) - 1；片段首尾空白归入分隔符"""
+    parts = SEPARATOR_PATTERN.split(text)
+    return parts[0::2], parts[1::2]
+
+
+def join_segments(segments: List[str], separators: List[str]) -> str:
+    """按原分隔符拼回"""
+    pieces = [segments[0]]
+    for separator, segment in zip(separators, segments[1:]):
+        pieces.append(separator)
+        pieces.append(segment)
+    return "".join(pieces)
+
+
+def needs_translation(segment: str, src_code: str) -> bool:
+    """片段是否包含源语言文字：中→英时不含汉字、英→中时不含英文字母的片段（数字、符号、已是目标语言的标签）原样保留"""
+    if not segment.strip():
+        return False
+    pattern = _CJK_PATTERN if src_code == "zh" else _LATIN_PATTERN
+    return bool(pattern.search(segment))
+
+
+# ---------------------------- 长提示词分块 ----------------------------
+# 单块最大字符数：限制单次推理的输入长度，长提示词的翻译耗时随长度线性增长
+MAX_CHUNK_CHARS = int(os.environ.get("PHANTOM_TRANSLATE_CHUNK_CHARS", "120"))
+
+# 分块边界，优先级从高到低：句末标点 → 逗号/顿号 → 空白；英文句点等需后接空白，避免切开小数与权重
+_CHUNK_BOUNDARIES = (
+    re.compile(r"[。！？；]\s*|[.!?;]\s+"),
+    re.compile(r"[，,、]\s*"),
+    re.compile(r"\s+"),
+)
+
+
+def _split_after(text: str, pattern: re.Pattern) -> Tuple[List[str], List[str]]:
+    """在边界处切开：标点留在前一段，其后的空白作为分隔符"""
+    pieces, separators = [], []
+    start = 0
+    for match in pattern.finditer(text):
+        if match.end() >= len(text):
+            break
+        boundary = match.group()
+        punct_end = match.start() + len(boundary.rstrip())
+        pieces.append(text[start:punct_end])
+        separators.append(text[punct_end:match.end()])
+        start = match.end()
+    pieces.append(text[start:])
+    return pieces, separators
+
+
+# 规则分句边界：句末标点、逗号/顿号/分号之后（英文句点需后接空白，避免切开小数与权重）
+_SENTENCE_PATTERN = re.compile(r"[。！？；，、!?;,]\s*|\.\s+")
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    """快速规则分句：标点留在所在句末，句间空白丢弃（分词器会在句首补词边界）"""
+    pieces, _ = _split_after(paragraph, _SENTENCE_PATTERN)
+    return [piece for piece in pieces if piece.strip()]
+
+
+def _pack_chunks(text: str, max_chars: int, level: int = 0) -> Tuple[List[str], List[str]]:
+    """按当前级别边界切开后贪心合并为不超过max_chars的块，仍超长的片段用下一级边界继续切，最后按长度硬切"""
+    if len(text) <= max_chars:
+        return [text], []
+    if level == len(_CHUNK_BOUNDARIES):
+        chunks = [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+        return chunks, [""] * (len(chunks) - 1)
+    pieces, piece_separators = _split_after(text, _CHUNK_BOUNDARIES[level])
+    chunks, separators = [], []
+    current, pending_separator = None, ""
+    for piece, separator in zip(pieces, piece_separators + [""]):
+        if current is not None and len(current) + len(pending_separator) + len(piece) <= max_chars:
+            current += pending_separator + piece
+        else:
+            if current is not None:
+                chunks.append(current)
+                separators.append(pending_separator)
+            if len(piece) > max_chars:
+                sub_chunks, sub_separators = _pack_chunks(piece, max_chars, level + 1)
+                chunks.extend(sub_chunks[:-1])
+                separators.extend(sub_separators)
+                current = sub_chunks[-1]
+            else:
+                current = piece
+        pending_separator = separator
+    chunks.append(current)
+    return chunks, separators
+
+
+def split_chunks(text: str, max_chars: int = MAX_CHUNK_CHARS) -> Tuple[List[str], List[str]]:
+    """长文本分块：先按换行分行（空行保留为空块），超长的行再按自然边界切成不超过max_chars的块；
+    返回(块列表, 分隔符列表)，行间分隔符为换行"""
+    chunks, separators = [], []
+    for line_idx, line in enumerate(text.split("\n")):
+        if line_idx:
+            separators.append("\n")
+        line_chunks, line_separators = _pack_chunks(line, max(1, max_chars))
+        chunks.extend(line_chunks)
+        separators.extend(line_separators)
+    return chunks, separators
+
+
+def join_chunks(chunks: List[str], separators: List[str], target_code: str) -> str:
+    """按原行结构拼回译文：换行原样保留；行内分隔符按目标语言调整（英文块之间补空格，中文块之间不留空格）"""
+    adjusted = []
+    for separator in separators:
+        if "\n" in separator:
+            adjusted.append(separator)
+        elif target_code == "en":
+            adjusted.append(separator or " ")
+        else:
+            adjusted.append("")
+    return join_segments(chunks, adjusted)
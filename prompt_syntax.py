@@ -0,0 +1,69 @@
+"""
+👻幻影工具 - 提示词语法保护
+识别ComfyUI/A1111提示词语法：权重括号与数值、<lora:…>等尖括号标签、embedding:名称、__通配符__、[a|b]交替与BREAK/AND关键字，
+受保护片段原样保留（逐字节不变），只把其间的自然语言片段交给翻译模型；译为英文时在译文与语法片段之间补空格
+"""
+import re
+from typing import List, Tuple
+
+# 受保护片段：整段保留的标签，以及语法符号（括号、权重数值、交替分隔符、关键字）
+PROTECTED_PATTERN = re.compile(r"""
+    <[^<>]*>                                # <lora:名称:0.8> / <hypernet:…> 等尖括号标签
+  | \bembedding:[^\s,，()\[\]{}<>|:]+       # embedding:名称
+  | __[\w\-./*]+__                          # __通配符__
+  | \\[()\[\]{}]                            # 转义括号 \( \)
+  | :\s*-?(?:\d+\.?\d*|\.\d+)               # 权重/步数 :1.2  [a:b:0.5]
+  | [()\[\]{}|:]                            # 权重括号、交替分隔符、提示词编辑冒号
+  | \bBREAK\b | \bAND\b                     # 分块与组合关键字
+""", re.VERBOSE)
+
+
+def split_prompt(text: str) -> List[Tuple[str, bool]]:
+    """切分为[(片段, 是否受保护)]，按顺序拼接即为原文；不含提示词语法时返回[(原文, False)]"""
+    parts = []
+    start = 0
+    for match in PROTECTED_PATTERN.finditer(text):
+        if match.start() > start:
+            parts.append((text[start:match.start()], False))
+        parts.append((match.group(), True))
+        start = match.end()
+    if start < len(text) or not parts:
+        parts.append((text[start:], False))
+    return parts
+
+
+# 自然语言片段首尾的空白与分隔标点（与语法符号相邻的逗号等），原样保留不送入模型
+_EDGE_CHARS = " \t\r\n,，、;；"
+
+
+# 英文译文与受保护片段相邻时补空格的条件：片段以左括号/标签/单词开头时补在前面，以右括号/标签/单词结尾时补在后面
+# （括号内侧、权重冒号、交替分隔符旁不补，如 girl (smile:1.1) standing、[cat|dog]）
+_SPACE_BEFORE = re.compile(r"^[(\[{<\w]")
+_SPACE_AFTER = re.compile(r"[)\]}>\w]$")
+
+
+def join_translated(parts: List[Tuple[str, bool]], tgt: str) -> str:
+    """按顺序拼接[(片段, 是否为译文)]；目标语言为英文时，译文与相邻原样片段的交界处缺少空格则补一个"""
+    result = ""
+    prev_translated = None
+    for piece, translated in parts:
+        if tgt == "en" and result and piece and prev_translated is not None and translated != prev_translated:
+            if translated:
+                need_space = piece[0].isalnum() and _SPACE_AFTER.search(result)
+            else:
+                need_space = result[-1].isalnum() and _SPACE_BEFORE.match(piece)
+            if need_space:
+                result += " "
+        result += piece
+        prev_translated = translated
+    return result
+
+
+def split_edges(piece: str) -> Tuple[str, str, str]:
+    """拆出片段首尾的空白与分隔标点：返回(前缀, 正文, 后缀)"""
+    core = piece.strip(_EDGE_CHARS)
+    if not core:
+        return piece, "", ""
+    lead = piece[:len(piece) - len(piece.lstrip(_EDGE_CHARS))]
+    trail = piece[len(piece.rstrip(_EDGE_CHARS)):]
+    return lead, core, trail
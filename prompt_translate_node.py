@@ -1,26 +1,39 @@
 """
 👻幻影工具 - 提示词翻译节点
 支持中英互译、自动语言检测，适配argostranslate1.9.0模型
+模型由进程级翻译器（prompt_translator）延迟加载一次，所有节点实例共用
+翻译结果走两级缓存（translation_cache），相同提示词重复执行无需再次推理
+分段增量翻译：按标签逐段缓存，修改提示词后只翻译新增/改动的标签
+长提示词按自然边界切成有界长度的块批量翻译，耗时随长度线性增长，再按原行结构拼回
+快速规则分句：按标点/逗号/换行分句后直接调用翻译模型，不加载Stanza分句模型
+提示词语法保护：权重、LoRA标签、embedding、通配符、交替语法原样保留，只翻译其间的自然语言
+词表优先：models目录下的词表完全覆盖的提示词直接查表，部分覆盖时只翻译未覆盖的片段
+提示词批量翻译节点：接收列表输入或按行拆分的多条提示词，合并为CTranslate2批次一次推理，输出列表
 """
 import os
 import sys
 import warnings
 import logging
-from typing import Tuple
+from typing import List, Tuple
+
+from .prompt_translator import ARGOS_AVAILABLE, DEFAULT_PROFILE, MAX_BATCH_SIZE, TRANSLATOR, get_translator
+from .translation_cache import TRANSLATION_CACHE
+from .prompt_segments import MAX_CHUNK_CHARS, split_segments, join_segments, needs_translation, split_chunks, join_chunks
+from .prompt_syntax import join_translated, split_prompt, split_edges
+from .prompt_glossary import GLOSSARY, convert_punctuation
 
 # 配置日志（适配ComfyUI标准日志体系）
 logger = logging.getLogger(__name__)
 # 忽略无关警告
 warnings.filterwarnings("ignore")
 
-# 核心依赖：argostranslate，版本>=1.9.0即可
-ARGOS_AVAILABLE = False
-try:
-    import argostranslate.package
-    import argostranslate.translate
-    ARGOS_AVAILABLE = True
-except ImportError:
-    logger.error("请安装argostranslate：pip install argostranslate>=1.9.0")
+# 性能档位（界面名称 -> 翻译器档位）
+PROFILE_OPTIONS = {"高质量": "quality", "均衡": "balanced", "快速": "fast"}
+DEFAULT_PROFILE_OPTION = next(name for name, profile in PROFILE_OPTIONS.items() if profile == DEFAULT_PROFILE)
+PROFILE_TOOLTIP = "高质量：与argostranslate默认参数一致（束搜索4）；均衡：int8量化+束搜索2；快速：int8量化+贪心解码，适合标签式短提示词，CPU上延迟最低"
+# 分句方式（界面名称 -> 翻译器分句方式）
+SEGMENTATION_OPTIONS = {"Stanza分句": "stanza", "快速规则分句": "rules"}
+SEGMENTATION_TOOLTIP = "Stanza分句：argostranslate默认的神经分句；快速规则分句：按标点/逗号/换行分句，不加载Stanza，短提示词更快、内存占用更低"
 
 
 class PromptTranslateNode:
@@ -50,64 +63,27 @@ class PromptTranslateNode:
                     "default": "英文",
                     "tooltip": "目标翻译语言，仅支持中英互译"
                 })
+            },
+            "optional": {
+                "翻译模式": (["整段翻译", "分段增量翻译"], {
+                    "default": "整段翻译",
+                    "tooltip": "分段增量翻译：按逗号/顿号/分号/换行切分标签，逐段缓存，只翻译未翻译过的标签（合并为一批推理），按原顺序与原分隔符拼回"
+                }),
+                "性能档位": (list(PROFILE_OPTIONS), {
+                    "default": DEFAULT_PROFILE_OPTION,
+                    "tooltip": PROFILE_TOOLTIP
+                }),
+                "分句方式": (list(SEGMENTATION_OPTIONS), {
+                    "default": "Stanza分句",
+                    "tooltip": SEGMENTATION_TOOLTIP
+                }),
+                "缓存预热文件": ("STRING", {
+                    "default": "",
+                    "tooltip": "可选-TXT文件路径：每行一条提示词，或「原文<TAB>译文」；执行前按当前翻译方向预热翻译缓存（文件不变时只预热一次）"
+                })
             }
         }
 
-    def __init__(self):
-        """初始化：仅加载一次模型，避免重复加载导致的异常"""
-        self.model_loaded = False  # 模型加载标记，防止重复加载
-        if ARGOS_AVAILABLE:
-            self._load_translate_model()  # 首次初始化加载模型
-        else:
-            logger.error("argostranslate未安装，模型加载跳过")
-
-    def _get_model_dir(self) -> str:
-        """获取模型文件路径：插件根目录下的models文件夹（适配跨系统路径）"""
-        plugin_root = os.path.dirname(os.path.abspath(__file__))
-        model_dir = os.path.join(plugin_root, "models")
-        os.makedirs(model_dir, exist_ok=True)  # 不存在则自动创建models文件夹
-        return model_dir
-
-    def _load_translate_model(self):
-        """加载模型：参考自动检测安装逻辑，仅执行一次，跳过已安装的模型"""
-        if self.model_loaded or not ARGOS_AVAILABLE:
-            return
-
-        model_dir = self._get_model_dir()
-        # 固定模型文件名，与指定的一致
-        model_files = [
-            "translate-en_zh-1_9.argosmodel",
-            "translate-zh_en-1_9.argosmodel"
-        ]
-
-        # 检查模型文件是否存在
-        missing_files = [f for f in model_files if not os.path.exists(os.path.join(model_dir, f))]
-        if missing_files:
-            error_msg = (
-                f"缺少翻译模型文件，请放入 {model_dir} 目录：\n" + "\n".join(missing_files) +
-                "\n模型下载地址：https://www.modelscope.cn/models/wer277/translate/files |  备用：https://www.argosopentech.com/argospm/index/"
-            )
-            logger.error(error_msg)
-            raise FileNotFoundError(error_msg)
-
-        # 安装模型：仅安装未被安装的，避免重复操作触发异常
-        try:
-            installed_pkgs = argostranslate.package.get_installed_packages()
-            for model_file in model_files:
-                model_path = os.path.join(model_dir, model_file)
-                pkg_name = os.path.splitext(model_file)[0]
-                # 判断模型是否已安装，避免重复安装
-                if not any(pkg_name in str(pkg) for pkg in installed_pkgs):
-                    argostranslate.package.install_from_path(model_path)
-                    logger.info(f"✅ 首次加载模型：{model_file}")
-                else:
-                    logger.info(f"ℹ️ 模型已加载，跳过：{model_file}")
-
-            self.model_loaded = True  # 标记模型已加载，后续不再执行
-        except Exception as e:
-            logger.error(f"模型安装失败：{str(e)}")
-            raise RuntimeError(f"模型安装失败：{str(e)}")
-
     def _detect_language(self, text: str) -> str:
         """优化版语言检测：提升准确性"""
         text_stripped = text.strip()
@@ -122,7 +98,74 @@ class PromptTranslateNode:
         # 优化判定规则：中文字符占比>30%为中文（适配提示词混合场景），否则为英文
         return "中文" if chinese_ratio > 0.3 else "英文"
 
-    def _core_translate(self, text: str, source: str, target: str) -> str:
+    def _wait_for_warmup(self, translator=TRANSLATOR):
+        """后台预热进行中时等待其完成（不再在首个任务中卡住无提示），并报告预热状态"""
+        if translator.status != "warming":
+            return
+        logger.info("ℹ️ 翻译模型后台预热中，等待完成...")
+        status = translator.wait_ready()
+        if status == "failed":
+            logger.warning(f"⚠️ 翻译模型预热失败：{translator.error}，本次执行重新尝试加载")
+        elif status == "warming":
+            logger.warning("⚠️ 等待翻译模型预热超时，继续执行")
+
+    def _translate_chunked(self, texts: List[str], src_code: str, tgt_code: str, translator=TRANSLATOR,
+                           max_batch_size: int = MAX_BATCH_SIZE, segmentation: str = "stanza") -> List[str]:
+        """长文本分块翻译：各文本按行及自然边界切成不超过MAX_CHUNK_CHARS的块，所有块合并为一批推理，再按原行结构拼回"""
+        chunked = [split_chunks(text, MAX_CHUNK_CHARS) for text in texts]
+        sources = [chunk for chunks, _ in chunked for chunk in chunks if chunk.strip()]
+        if sources:
+            # 后台预热中则先等待；模型在首次推理时由翻译器加载（或交给进程外翻译服务）
+            self._wait_for_warmup(translator)
+        translated = iter(translator.translate_batch(sources, src_code, tgt_code, max_batch_size, segmentation))
+        results = []
+        for chunks, separators in chunked:
+            pieces = [(next(translated).strip() or chunk) if chunk.strip() else chunk for chunk in chunks]
+            results.append(join_chunks(pieces, separators, tgt_code))
+        return results
+
+    def _translate_protected(self, texts: List[str], src_code: str, tgt_code: str, translator=TRANSLATOR,
+                             max_batch_size: int = MAX_BATCH_SIZE, segmentation: str = "stanza") -> List[str]:
+        """提示词语法保护翻译：各文本拆出受保护片段（权重、LoRA、embedding、通配符、交替语法等），
+        自然语言片段先查词表，词表未覆盖的部分合并为一批交给模型翻译，再拼回原位置（译为英文时与语法片段之间补空格）；受保护片段逐字节不变"""
+        layouts = [split_prompt(text) for text in texts]
+        plans = {}  # 自然语言片段 -> 词表切分结果[(原文, 译文或None)]
+        for parts in layouts:
+            for piece, protected in parts:
+                core = split_edges(piece)[1]
+                if not protected and needs_translation(core, src_code) and core not in plans:
+                    plans[core] = GLOSSARY.plan(core, src_code, tgt_code)
+        sources = list(dict.fromkeys(text for plan in plans.values() for text, translation in plan if translation is None))
+        translated = dict(zip(sources, self._translate_chunked(
+            sources, src_code, tgt_code, translator, max_batch_size, segmentation
+        )))
+        results = []
+        for parts in layouts:
+            pieces = []
+            for piece, protected in parts:
+                lead, core, trail = split_edges(piece)
+                if core in plans and not protected:
+                    core = GLOSSARY.join([
+                        translation if translation is not None else (translated[text].strip() or text)
+                        for text, translation in plans[core]
+                    ], tgt_code)
+                    piece = convert_punctuation(lead, tgt_code) + core + convert_punctuation(trail, tgt_code)
+                    pieces.append((piece, True))
+                else:
+                    pieces.append((piece, False))
+            results.append(join_translated(pieces, tgt_code))
+        return results
+
+    def _cache_key(self, translator, src_code: str, tgt_code: str, segmentation: str) -> str:
+        """翻译缓存键中的模型标识：翻译器档位/分句方式，加上词表版本（词表修改后旧译文自动失效）"""
+        key = translator.cache_key(src_code, tgt_code, segmentation)
+        GLOSSARY.refresh()
+        if key and GLOSSARY.version:
+            key = f"{key}+glossary-{GLOSSARY.version[:12]}"
+        return key
+
+    def _core_translate(self, text: str, source: str, target: str, translator=TRANSLATOR,
+                        segmentation: str = "stanza") -> str:
         """核心翻译方法：增强鲁棒性"""
         text_stripped = text.strip()
         if not text_stripped:
@@ -132,21 +175,92 @@ class PromptTranslateNode:
         lang_map = {"中文": "zh", "英文": "en"}
         src_code, tgt_code = lang_map[source], lang_map[target]
 
+        # 缓存查询：键含模型文件哈希，替换模型后自动失效；命中时无需加载模型
+        model_hash = self._cache_key(translator, src_code, tgt_code, segmentation)
+        cached = TRANSLATION_CACHE.get(text_stripped, src_code, tgt_code, model_hash) if model_hash else None
+        if cached is not None:
+            return cached
+
         try:
-            # 执行翻译：直接返回原始翻译结果（移除所有去重逻辑）
-            raw_result = argostranslate.translate.translate(text_stripped, src_code, tgt_code)
+            # 执行翻译：提示词语法原样保留，自然语言部分长提示词分块后一批推理，按原行结构拼回；模型由进程级翻译器复用
+            raw_result = self._translate_protected([text_stripped], src_code, tgt_code, translator,
+                                                   segmentation=segmentation)[0]
             if not raw_result.strip():
                 logger.warning("翻译结果为空，返回原文本")
                 return text_stripped
 
             final_result = raw_result.strip()
-            return final_result if final_result else text_stripped
+            TRANSLATION_CACHE.put(text_stripped, src_code, tgt_code, model_hash, final_result)
+            return final_result
 
         except Exception as e:
+            if translator.state == "failed":
+                raise  # 模型加载失败（如缺少模型文件）交给上层提示
             logger.error(f"核心翻译逻辑出错：{str(e)}")
             return text_stripped
 
-    def translate_prompt(self, 输入文本: str, 源语言: str, 输出语言: str) -> Tuple[str]:
+    def _segment_translate(self, text: str, source: str, target: str, translator=TRANSLATOR,
+                           segmentation: str = "stanza") -> str:
+        """分段增量翻译：逐段查缓存，未命中的片段去重后一次批量翻译，按原顺序与原分隔符拼回"""
+        lang_map = {"中文": "zh", "英文": "en"}
+        src_code, tgt_code = lang_map[source], lang_map[target]
+        segments, separators = split_segments(text)
+        model_hash = self._cache_key(translator, src_code, tgt_code, segmentation)
+
+        results = list(segments)
+        pending = {}  # 待翻译片段 -> 所在位置列表（相同片段只翻译一次）
+        for i, segment in enumerate(segments):
+            if not needs_translation(segment, src_code):
+                continue
+            cached = TRANSLATION_CACHE.get(segment, src_code, tgt_code, model_hash) if model_hash else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(segment.strip(), []).append(i)
+
+        if pending:
+            sources = list(pending)
+            try:
+                translated = self._translate_protected(sources, src_code, tgt_code, translator, segmentation=segmentation)
+            except Exception as e:
+                if translator.state == "failed":
+                    raise  # 模型加载失败（如缺少模型文件）交给上层提示
+                logger.error(f"分段翻译出错：{str(e)}")
+                translated = []  # 保留原片段，失败结果不写入缓存
+            for segment, raw_result in zip(sources, translated):
+                final_result = raw_result.strip()
+                if not final_result:
+                    continue  # 译文为空时保留原片段
+                TRANSLATION_CACHE.put(segment, src_code, tgt_code, model_hash, final_result)
+                for i in pending[segment]:
+                    results[i] = final_result
+
+        translatable = sum(1 for segment in segments if needs_translation(segment, src_code))
+        logger.info(f"ℹ️ 分段翻译 | 共{len(segments)}段，需翻译{translatable}段，"
+                    f"新翻译{len(pending)}段，缓存命中{translatable - sum(len(v) for v in pending.values())}段")
+        return join_segments(results, separators)
+
+    def _prewarm_cache(self, file_path: str, source: str, target: str, translator=TRANSLATOR,
+                       segmentation: str = "stanza"):
+        """按当前翻译方向从文件预热翻译缓存，预热失败不影响本次翻译"""
+        lang_map = {"中文": "zh", "英文": "en"}
+        src_code, tgt_code = lang_map[source], lang_map[target]
+        try:
+            model_hash = self._cache_key(translator, src_code, tgt_code, segmentation)
+            if not model_hash:
+                return
+            added = TRANSLATION_CACHE.prewarm_from_file(
+                file_path, src_code, tgt_code, model_hash,
+                lambda text: self._translate_protected([text], src_code, tgt_code, translator, segmentation=segmentation)[0]
+            )
+            if added:
+                logger.info(f"✅ 翻译缓存预热完成，新增{added}条")
+        except Exception as e:
+            logger.warning(f"⚠️ 翻译缓存预热失败：{str(e)}")
+
+    def translate_prompt(self, 输入文本: str, 源语言: str, 输出语言: str, 翻译模式: str = "整段翻译",
+                         性能档位: str = DEFAULT_PROFILE_OPTION, 分句方式: str = "Stanza分句",
+                         缓存预热文件: str = "") -> Tuple[str]:
         """节点主执行函数：串联所有逻辑，对外提供统一接口"""
         # 前置检查：依赖未安装直接返回错误提示
         if not ARGOS_AVAILABLE:
@@ -168,9 +282,20 @@ class PromptTranslateNode:
                 logger.info(f"ℹ️ 源语言与输出语言一致（{actual_source}），直接返回原文本")
                 return (input_text,)
 
-            # 执行翻译并返回结果
-            final_result = self._core_translate(input_text, actual_source, 输出语言)
-            logger.info(f"✅ 翻译完成 | {actual_source} → {输出语言} | 结果预览：{final_result[:50]}...")
+            translator = get_translator(PROFILE_OPTIONS.get(性能档位, DEFAULT_PROFILE))
+            segmentation = SEGMENTATION_OPTIONS.get(分句方式, "stanza")
+            if 缓存预热文件 and os.path.isfile(缓存预热文件.strip()):
+                self._prewarm_cache(缓存预热文件.strip(), actual_source, 输出语言, translator, segmentation)
+
+            # 执行翻译并返回结果（首次推理时加载模型，缺少模型文件等错误直接提示）
+            if 翻译模式 == "分段增量翻译":
+                final_result = self._segment_translate(input_text, actual_source, 输出语言, translator, segmentation)
+            else:
+                final_result = self._core_translate(input_text, actual_source, 输出语言, translator, segmentation)
+            logger.info(f"✅ 翻译完成 | {actual_source} → {输出语言} | {性能档位} | 结果预览：{final_result[:50]}...")
+            logger.info(f"ℹ️ 翻译缓存 | {TRANSLATION_CACHE.format_stats()}")
+            if GLOSSARY.version:
+                logger.info(f"ℹ️ 词表 | {GLOSSARY.format_stats()}")
             return (final_result,)
 
         except Exception as e:
@@ -179,13 +304,146 @@ class PromptTranslateNode:
             return (error_info,)  # 异常返回错误信息，更友好
 
 
+class PromptBatchTranslateNode(PromptTranslateNode):
+    """提示词批量翻译：列表输入（如读取TXT/通配符列表的节点输出）或多行文本按行拆分，所有提示词一次批量推理"""
+    FUNCTION = "translate_batch"
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("输出文本列表", "合并文本")
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = (True, False)
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "输入文本": ("STRING", {
+                    "default": "",
+                    "multiline": True,
+                    "placeholder": "每行一条提示词，或连接列表输出",
+                    "tooltip": "支持列表输入；按行拆分时每行作为一条提示词"
+                }),
+                "源语言": (["自动检测", "中文", "英文"], {
+                    "default": "自动检测",
+                    "tooltip": "自动检测时逐条识别中文/英文"
+                }),
+                "输出语言": (["英文", "中文"], {
+                    "default": "英文",
+                    "tooltip": "目标翻译语言，仅支持中英互译"
+                })
+            },
+            "optional": {
+                "拆分方式": (["按行拆分", "不拆分"], {
+                    "default": "按行拆分",
+                    "tooltip": "按行拆分：每个输入按换行拆成多条提示词（忽略空行）；不拆分：每个列表元素作为一条提示词"
+                }),
+                "性能档位": (list(PROFILE_OPTIONS), {
+                    "default": DEFAULT_PROFILE_OPTION,
+                    "tooltip": PROFILE_TOOLTIP
+                }),
+                "分句方式": (list(SEGMENTATION_OPTIONS), {
+                    "default": "Stanza分句",
+                    "tooltip": SEGMENTATION_TOOLTIP
+                }),
+                "最大批量": ("INT", {
+                    "default": MAX_BATCH_SIZE,
+                    "min": 1,
+                    "max": 1024,
+                    "tooltip": "单次批量推理的最大句子数，越大吞吐越高、内存占用越大"
+                })
+            }
+        }
+
+    def _batch_translate(self, items: List[str], source: str, target: str, max_batch_size: int,
+                         translator=TRANSLATOR, segmentation: str = "stanza") -> List[str]:
+        """同一翻译方向的多条提示词：逐条查缓存，未命中的去重后一次批量翻译"""
+        lang_map = {"中文": "zh", "英文": "en"}
+        src_code, tgt_code = lang_map[source], lang_map[target]
+        model_hash = self._cache_key(translator, src_code, tgt_code, segmentation)
+
+        results = list(items)
+        pending = {}  # 待翻译提示词 -> 所在位置列表
+        for i, item in enumerate(items):
+            cached = TRANSLATION_CACHE.get(item, src_code, tgt_code, model_hash) if model_hash else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(item, []).append(i)
+
+        if pending:
+            sources = list(pending)
+            try:
+                translated = self._translate_protected(sources, src_code, tgt_code, translator, max_batch_size, segmentation)
+            except Exception as e:
+                if translator.state == "failed":
+                    raise  # 模型加载失败（如缺少模型文件）交给上层提示
+                logger.error(f"批量翻译出错：{str(e)}")
+                translated = []  # 保留原文本，失败结果不写入缓存
+            for item, raw_result in zip(sources, translated):
+                final_result = raw_result.strip()
+                if not final_result:
+                    continue  # 译文为空时保留原文本
+                TRANSLATION_CACHE.put(item, src_code, tgt_code, model_hash, final_result)
+                for i in pending[item]:
+                    results[i] = final_result
+        logger.info(f"ℹ️ 批量翻译 | {source} → {target} | 共{len(items)}条，新翻译{len(pending)}条")
+        return results
+
+    def translate_batch(self, 输入文本: List[str], 源语言: List[str], 输出语言: List[str],
+                        拆分方式: List[str] = None, 性能档位: List[str] = None, 分句方式: List[str] = None,
+                        最大批量: List[int] = None) -> Tuple[List[str], str]:
+        """批量节点主执行函数：INPUT_IS_LIST下所有参数均为列表，选项类参数取第一个"""
+        source_option, target = 源语言[0], 输出语言[0]
+        split_lines = (拆分方式 or ["按行拆分"])[0] == "按行拆分"
+        max_batch_size = (最大批量 or [MAX_BATCH_SIZE])[0]
+        translator = get_translator(PROFILE_OPTIONS.get((性能档位 or [DEFAULT_PROFILE_OPTION])[0], DEFAULT_PROFILE))
+        segmentation = SEGMENTATION_OPTIONS.get((分句方式 or ["Stanza分句"])[0], "stanza")
+
+        items = []
+        for text in 输入文本:
+            if split_lines:
+                items.extend(line.strip() for line in text.splitlines() if line.strip())
+            elif text.strip():
+                items.append(text.strip())
+        if not items:
+            return ([], "")
+        if not ARGOS_AVAILABLE:
+            error_msg = "翻译失败：未检测到argostranslate依赖，请先安装"
+            logger.error(error_msg)
+            return ([error_msg] * len(items), error_msg)
+
+        try:
+            # 按实际源语言分组，每组一次批量推理；源语言与目标语言一致的原样输出
+            results = list(items)
+            groups = {}
+            for i, item in enumerate(items):
+                source = self._detect_language(item) if source_option == "自动检测" else source_option
+                if source != target:
+                    groups.setdefault(source, []).append(i)
+            for source, indices in groups.items():
+                translated = self._batch_translate([items[i] for i in indices], source, target, max_batch_size,
+                                                   translator, segmentation)
+                for i, result in zip(indices, translated):
+                    results[i] = result
+            logger.info(f"ℹ️ 翻译缓存 | {TRANSLATION_CACHE.format_stats()}")
+            if GLOSSARY.version:
+                logger.info(f"ℹ️ 词表 | {GLOSSARY.format_stats()}")
+            return (results, "\n".join(results))
+
+        except Exception as e:
+            error_info = f"翻译失败：{str(e)[:100]}"
+            logger.error(f"❌ {error_info}")
+            return ([error_info] * len(items), error_info)
+
+
 # 节点注册（与__init__.py对应）
 NODE_CLASS_MAPPINGS = {
-    "PromptTranslateNode": PromptTranslateNode
+    "PromptTranslateNode": PromptTranslateNode,
+    "PromptBatchTranslateNode": PromptBatchTranslateNode
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "PromptTranslateNode": "提示词翻译"
+    "PromptTranslateNode": "提示词翻译",
+    "PromptBatchTranslateNode": "提示词批量翻译"
 }
 
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS']
@@ -0,0 +1,379 @@
+"""
+👻幻影工具 - 进程级翻译器
+整个ComfyUI进程共用一个翻译器：首次翻译时才安装/加载模型，并一次性解析中→英、英→中Translation对象，
+之后所有节点实例的每次调用只剩模型推理，不再重复扫描已安装模型包
+批量翻译直接调用CTranslate2的translate_batch，多条提示词合并为批次做束搜索，而不是逐条调用translate()
+可选后台预热（PHANTOM_TRANSLATE_WARMUP=1）：插件导入时在后台线程加载模型并试译一次，首个翻译任务不再卡在加载上
+性能档位（fast / balanced / quality）：每个档位一个翻译器，各自持有按档位参数（计算精度、线程数）加载的CTranslate2模型
+分句方式：stanza（与argostranslate一致的神经分句）或rules（规则分句，直接调用CTranslate2，不加载Stanza模型）
+进程外翻译（PHANTOM_TRANSLATE_WORKER=1）：推理转交本机共享的翻译服务进程（translate_worker），服务不可用时在本进程内翻译
+"""
+import os
+import hashlib
+import threading
+import logging
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+
+from .prompt_segments import split_sentences
+from .translate_worker import WORKER_CLIENT
+
+logger = logging.getLogger(__name__)
+
+# 核心依赖：argostranslate，版本>=1.9.0即可
+ARGOS_AVAILABLE = False
+try:
+    import argostranslate.package
+    import argostranslate.translate
+    import argostranslate.settings as argos_settings
+    import ctranslate2
+    ARGOS_AVAILABLE = True
+except ImportError:
+    logger.error("请安装argostranslate：pip install argostranslate>=1.9.0")
+
+# 插件导入时是否在后台预热翻译模型（默认关闭），以及节点执行时等待预热完成的最长秒数
+WARMUP_ON_IMPORT = os.environ.get("PHANTOM_TRANSLATE_WARMUP", "0") == "1"
+WARMUP_WAIT_SECONDS = float(os.environ.get("PHANTOM_TRANSLATE_WARMUP_WAIT", "300"))
+# 预热试译文本：各翻译方向各一条，触发模型权重加载与推理缓冲区分配
+WARMUP_TEXTS = {("en", "zh"): "a girl", ("zh", "en"): "一个女孩"}
+
+# 单次CTranslate2批量推理的最大句子数，可通过环境变量调整
+MAX_BATCH_SIZE = int(os.environ.get("PHANTOM_TRANSLATE_BATCH_SIZE", "32"))
+
+# 性能档位：compute_type为CTranslate2计算精度（default即模型自身精度），beam_size=1为贪心解码
+# quality与argostranslate默认参数一致；fast适合标签式短提示词，int8贪心解码延迟最低
+TRANSLATION_PROFILES = {
+    "fast": {"compute_type": "int8", "beam_size": 1, "max_decoding_length": 128},
+    "balanced": {"compute_type": "int8", "beam_size": 2, "max_decoding_length": 256},
+    "quality": {"compute_type": "default", "beam_size": 4, "max_decoding_length": 256},
+}
+DEFAULT_PROFILE = os.environ.get("PHANTOM_TRANSLATE_PROFILE", "quality")
+if DEFAULT_PROFILE not in TRANSLATION_PROFILES:
+    DEFAULT_PROFILE = "quality"
+# 分句方式：stanza为argostranslate默认的神经分句，rules为按标点/逗号/换行的规则分句（不加载Stanza）
+SEGMENTATION_MODES = ("stanza", "rules")
+
+# CTranslate2线程数（所有档位共用）：intra为单次推理的计算线程（0=自动），inter为可并行推理的批次数
+INTRA_THREADS = int(os.environ.get("PHANTOM_TRANSLATE_INTRA_THREADS", "0"))
+INTER_THREADS = int(os.environ.get("PHANTOM_TRANSLATE_INTER_THREADS", "1"))
+
+# 翻译方向 -> 模型文件名（固定文件名，放在插件models目录）
+MODEL_FILES = {
+    ("en", "zh"): "translate-en_zh-1_9.argosmodel",
+    ("zh", "en"): "translate-zh_en-1_9.argosmodel",
+}
+# 安装后写入模型包目录的记录文件：安装时模型文件的sha1，用于发现models目录中的模型文件被替换
+INSTALLED_HASH_FILE = ".phantom_model_sha1"
+MODEL_DOWNLOAD_HINT = "模型下载地址：https://www.modelscope.cn/models/wer277/translate/files |  备用：https://www.argosopentech.com/argospm/index/"
+
+
+def get_model_dir() -> str:
+    """模型文件路径：插件根目录下的models文件夹（不存在则自动创建）"""
+    plugin_root = os.path.dirname(os.path.abspath(__file__))
+    model_dir = os.path.join(plugin_root, "models")
+    os.makedirs(model_dir, exist_ok=True)
+    return model_dir
+
+
+class BatchTranslationEngine:
+    """单个翻译方向的CTranslate2批量推理：与argostranslate相同的分段/分句、分词与解码流程，
+    区别是所有输入的句子合并为一次translate_batch调用，Stanza分句管道只创建一次，解码参数取自性能档位"""
+
+    def __init__(self, pkg, profile: str):
+        self.pkg = pkg  # argostranslate本地模型包（分词器、模型路径）
+        self.profile = profile
+        self.options = TRANSLATION_PROFILES[profile]
+        self._translator = None
+        self._stanza_pipeline = None
+
+    @classmethod
+    def from_translation(cls, translation, profile: str) -> Optional["BatchTranslationEngine"]:
+        """从argostranslate Translation对象（可能被CachedTranslation包装）取出底层模型包；非本地模型包时返回None"""
+        while hasattr(translation, "underlying"):
+            translation = translation.underlying
+        if hasattr(translation, "pkg") and hasattr(translation.pkg, "tokenizer"):
+            return cls(translation.pkg, profile)
+        return None
+
+    def _get_translator(self):
+        """按档位精度与线程数加载CTranslate2模型；设备不支持该精度时退回模型自身精度"""
+        if self._translator is None:
+            model_path = str(self.pkg.package_path / "model")
+            kwargs = {"device": argos_settings.device, "inter_threads": INTER_THREADS, "intra_threads": INTRA_THREADS}
+            try:
+                self._translator = ctranslate2.Translator(model_path, compute_type=self.options["compute_type"], **kwargs)
+            except ValueError as e:
+                logger.warning(f"⚠️ 当前设备不支持{self.options['compute_type']}精度（{str(e)}），使用模型默认精度")
+                self._translator = ctranslate2.Translator(model_path, compute_type="default", **kwargs)
+        return self._translator
+
+    def _split_sentences(self, paragraph: str, segmentation: str) -> List[str]:
+        if segmentation == "rules":
+            return split_sentences(paragraph) or [paragraph]
+        if self.pkg.type == "sbd" or not argos_settings.stanza_available:
+            return [paragraph]
+        if self._stanza_pipeline is None:
+            import stanza
+            self._stanza_pipeline = stanza.Pipeline(
+                lang=self.pkg.from_code, dir=str(self.pkg.package_path / "stanza"), processors="tokenize",
+                use_gpu=argos_settings.device == "cuda", logging_level="WARNING"
+            )
+        return [sentence.text for sentence in self._stanza_pipeline(paragraph).sentences]
+
+    def _decode(self, tokens: List[str]) -> str:
+        value = self.pkg.tokenizer.decode(tokens)
+        if self.pkg.target_prefix and value.startswith(self.pkg.target_prefix):
+            value = value[len(self.pkg.target_prefix):]
+        return value[1:] if value.startswith(" ") else value
+
+    def translate_batch(self, texts: List[str], max_batch_size: int = MAX_BATCH_SIZE,
+                        segmentation: str = "stanza") -> List[str]:
+        """按换行分段、段内分句（stanza / rules），所有句子一次批量推理，再按段拼回各条译文"""
+        sentences = []
+        layout = []  # 每条输入 -> 每段对应的句子序号列表
+        for text in texts:
+            paragraphs = []
+            for paragraph in text.split("\n"):
+                indices = []
+                if paragraph.strip():
+                    for sentence in self._split_sentences(paragraph, segmentation):
+                        indices.append(len(sentences))
+                        sentences.append(self.pkg.tokenizer.encode(sentence))
+                paragraphs.append(indices)
+            layout.append(paragraphs)
+
+        hypotheses = []
+        if sentences:
+            target_prefix = [[self.pkg.target_prefix]] * len(sentences) if self.pkg.target_prefix else None
+            results = self._get_translator().translate_batch(
+                sentences, target_prefix=target_prefix, replace_unknowns=True,
+                max_batch_size=max(1, max_batch_size), beam_size=self.options["beam_size"],
+                max_decoding_length=self.options["max_decoding_length"], num_hypotheses=1, length_penalty=0.2
+            )
+            hypotheses = [result.hypotheses[0] for result in results]
+
+        outputs = []
+        for paragraphs in layout:
+            translated = [
+                self._decode([token for i in indices for token in hypotheses[i]]) if indices else ""
+                for indices in paragraphs
+            ]
+            outputs.append("\n".join(translated).lstrip("\n"))
+        return outputs
+
+
+class PromptTranslator:
+    """进程级翻译器（线程安全、延迟加载）
+
+    状态：cold（未加载）→ loaded（模型包已安装、Translation对象已解析）→ warm（已完成首次推理，模型常驻内存）；
+    加载失败时为failed，下次调用会重新尝试；对外的预热状态见status（warming / ready / failed）
+    """
+
+    def __init__(self, profile: str = DEFAULT_PROFILE):
+        self.profile = profile
+        self.state = "cold"
+        self._translations: Dict[Tuple[str, str], object] = {}
+        self._load_lock = threading.Lock()
+        self._run_locks = {direction: threading.Lock() for direction in MODEL_FILES}
+        self._engines: Dict[Tuple[str, str], Optional[BatchTranslationEngine]] = {}
+        self._model_hashes = {}  # 模型文件路径 -> (文件大小, 修改时间, sha1)
+        self._loaded_hashes: Dict[Tuple[str, str], str] = {}  # 翻译方向 -> 已加载模型对应模型文件的sha1
+        self._warmup_thread = None
+        self._warmup_done = threading.Event()
+        self.error = ""  # 最近一次加载/预热失败的原因
+
+    @property
+    def is_warm(self) -> bool:
+        return self.state == "warm"
+
+    @property
+    def status(self) -> str:
+        """预热状态：warming（后台预热中）/ ready（模型已加载）/ failed（加载失败）/ cold（尚未加载）"""
+        if self._warmup_thread is not None and self._warmup_thread.is_alive():
+            return "warming"
+        if self.state in ("loaded", "warm"):
+            return "ready"
+        return self.state
+
+    def start_warmup(self) -> bool:
+        """启动后台预热线程：加载模型并对各方向试译一次；已在预热或已加载时不重复启动"""
+        if self.status in ("warming", "ready"):
+            return False
+        self._warmup_done.clear()
+        self._warmup_thread = threading.Thread(target=self._warmup, name="phantom-translate-warmup", daemon=True)
+        self._warmup_thread.start()
+        return True
+
+    def _warmup(self):
+        try:
+            for (src, tgt), text in WARMUP_TEXTS.items():
+                self.translate(text, src, tgt)
+            logger.info("✅ 翻译模型后台预热完成")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.warning(f"⚠️ 翻译模型后台预热失败：{str(e)}")
+        finally:
+            self._warmup_done.set()
+
+    def wait_ready(self, timeout: float = WARMUP_WAIT_SECONDS) -> str:
+        """后台预热进行中时等待其结束（最多timeout秒），返回等待后的状态"""
+        if self.status == "warming":
+            self._warmup_done.wait(timeout)
+        return self.status
+
+    def cache_key(self, src: str, tgt: str, segmentation: str = "stanza") -> str:
+        """翻译缓存使用的模型标识：实际加载的模型（未加载时为将要安装的模型文件）的哈希，
+        非quality档位、非stanza分句时附加档位名/分句方式（译文可能不同）；模型文件不存在时返回空字符串"""
+        digest = self._loaded_hashes.get((src, tgt)) or self.model_hash(src, tgt)
+        if not digest:
+            return digest
+        if self.profile != "quality":
+            digest = f"{digest}+{self.profile}"
+        if segmentation != "stanza":
+            digest = f"{digest}+{segmentation}"
+        return digest
+
+    def model_hash(self, src: str, tgt: str) -> str:
+        """翻译方向对应模型文件的sha1（按文件大小与修改时间记忆，替换模型文件后重新计算）；文件不存在时返回空字符串"""
+        model_path = os.path.join(get_model_dir(), MODEL_FILES[(src, tgt)])
+        try:
+            stat = os.stat(model_path)
+        except OSError:
+            return ""
+        cached = self._model_hashes.get(model_path)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        digest = hashlib.sha1()
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        self._model_hashes[model_path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _installed_hash(pkg) -> str:
+        try:
+            with open(os.path.join(pkg.package_path, INSTALLED_HASH_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except (OSError, AttributeError, TypeError):
+            return ""
+
+    @staticmethod
+    def _packages_for(direction: Tuple[str, str]) -> list:
+        return [pkg for pkg in argostranslate.package.get_installed_packages()
+                if (pkg.from_code, pkg.to_code) == direction]
+
+    def _install_packages(self, model_dir: str) -> Dict[Tuple[str, str], str]:
+        """安装模型包：已安装包记录的模型文件哈希与当前文件一致时跳过；模型文件被替换（或安装时未记录哈希）时
+        卸载该方向的旧包后重新安装。返回各翻译方向已安装模型的文件哈希"""
+        missing_files = [f for f in MODEL_FILES.values() if not os.path.exists(os.path.join(model_dir, f))]
+        if missing_files:
+            raise FileNotFoundError(
+                f"缺少翻译模型文件，请放入 {model_dir} 目录：\n" + "\n".join(missing_files) + "\n" + MODEL_DOWNLOAD_HINT
+            )
+        installed_hashes = {}
+        for direction, model_file in MODEL_FILES.items():
+            digest = self.model_hash(*direction)
+            packages = self._packages_for(direction)
+            if any(self._installed_hash(pkg) == digest for pkg in packages):
+                logger.info(f"ℹ️ 模型已安装，跳过：{model_file}")
+            else:
+                for pkg in packages:
+                    argostranslate.package.uninstall(pkg)
+                argostranslate.package.install_from_path(os.path.join(model_dir, model_file))
+                for pkg in self._packages_for(direction):
+                    with open(os.path.join(pkg.package_path, INSTALLED_HASH_FILE), "w", encoding="utf-8") as f:
+                        f.write(digest)
+                logger.info(f"✅ {'模型文件已变化，重新安装' if packages else '首次安装模型'}：{model_file}")
+            installed_hashes[direction] = digest
+        return installed_hashes
+
+    def ensure_loaded(self):
+        """确保模型已安装且各方向Translation对象已解析（仅首次调用执行，并发调用只加载一次）"""
+        if self._translations:
+            return
+        if not ARGOS_AVAILABLE:
+            raise RuntimeError("未检测到argostranslate依赖，请先安装：pip install argostranslate>=1.9.0")
+        with self._load_lock:
+            if self._translations:
+                return
+            try:
+                with _INSTALL_LOCK:  # 各档位翻译器共用argostranslate安装目录
+                    installed_hashes = self._install_packages(get_model_dir())
+                languages = {lang.code: lang for lang in argostranslate.translate.get_installed_languages()}
+                translations = {}
+                for src, tgt in MODEL_FILES:
+                    translation = languages[src].get_translation(languages[tgt]) if src in languages and tgt in languages else None
+                    if translation is None:
+                        raise RuntimeError(f"未找到{src}→{tgt}翻译模型")
+                    translations[(src, tgt)] = translation
+                self._engines = {direction: BatchTranslationEngine.from_translation(translation, self.profile)
+                                 for direction, translation in translations.items()}
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                logger.error(f"模型加载失败：{str(e)}")
+                raise
+            self.error = ""
+            self._loaded_hashes = installed_hashes
+            self._translations = translations
+            self.state = "loaded"
+            logger.info("✅ 翻译模型已加载（中→英 / 英→中）")
+
+    def translate(self, text: str, src: str, tgt: str, segmentation: str = "stanza") -> str:
+        """翻译文本（src/tgt为argostranslate语言代码zh/en），同一方向的推理串行执行；按本档位参数推理"""
+        return self.translate_batch([text], src, tgt, segmentation=segmentation)[0]
+
+    def translate_batch(self, texts: List[str], src: str, tgt: str, max_batch_size: int = MAX_BATCH_SIZE,
+                        segmentation: str = "stanza") -> List[str]:
+        """批量翻译：所有文本合并为CTranslate2批次推理（每批最多max_batch_size句），按输入顺序返回；
+        非本地模型包（无法取得CTranslate2模型）时逐条交给argostranslate翻译（分句方式由argostranslate决定）；
+        启用进程外翻译时优先交给翻译服务，服务不可用才在本进程加载模型"""
+        if not texts:
+            return []
+        try:
+            results = WORKER_CLIENT.translate_batch(texts, src, tgt, self.profile, segmentation, max_batch_size)
+        except RuntimeError as e:
+            self.state = "failed"
+            self.error = str(e)
+            raise
+        if results is not None:
+            self.state = "warm"
+            return results
+        self.ensure_loaded()
+        engine = self._engines.get((src, tgt))
+        with self._run_locks[(src, tgt)]:
+            if engine is not None:
+                results = engine.translate_batch(texts, max_batch_size, segmentation)
+            else:
+                translation = self._translations[(src, tgt)]
+                results = [translation.translate(text) for text in texts]
+        if self.state != "warm":
+            self.state = "warm"
+        return results
+
+
+# 进程级翻译器：每个性能档位一个，按需创建
+_TRANSLATORS: Dict[str, PromptTranslator] = {}
+_TRANSLATORS_LOCK = threading.Lock()
+_INSTALL_LOCK = threading.Lock()
+
+
+def get_translator(profile: str = DEFAULT_PROFILE) -> PromptTranslator:
+    """取得指定性能档位的进程级翻译器（未知档位按默认档位处理）"""
+    if profile not in TRANSLATION_PROFILES:
+        profile = DEFAULT_PROFILE
+    with _TRANSLATORS_LOCK:
+        translator = _TRANSLATORS.get(profile)
+        if translator is None:
+            translator = _TRANSLATORS[profile] = PromptTranslator(profile)
+        return translator
+
+
+# 默认档位的共享翻译器（后台预热对象）
+TRANSLATOR = get_translator()
+
+# 后台预热只在ComfyUI主进程启动，并行抽帧等子进程导入插件时跳过
+if WARMUP_ON_IMPORT and ARGOS_AVAILABLE and multiprocessing.parent_process() is None:
+    TRANSLATOR.start_warmup()
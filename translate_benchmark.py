@@ -0,0 +1,120 @@
+"""
+👻幻影工具 - 翻译分句方式基准测试
+对比Stanza分句与快速规则分句的翻译延迟与常驻内存；每种方式在独立子进程中运行（Stanza模型加载后无法卸载，互不干扰）
+用法（在插件目录下执行）：python translate_benchmark.py [提示词TXT文件] [--rounds 5] [--profile quality] [--source zh --target en]
+"""
+import os
+import sys
+import time
+import argparse
+import importlib
+import statistics
+import multiprocessing
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 未指定提示词文件时使用的标签式提示词
+DEFAULT_PROMPTS = {
+    "zh": [
+        "杰作，最佳质量，高清，一个女孩，长发，红色连衣裙，微笑",
+        "城市夜景，霓虹灯，下雨，电影感光效",
+        "森林中的小木屋，清晨，薄雾。阳光透过树叶洒下来。",
+        "赛博朋克风格，机械手臂，未来城市，高细节",
+    ],
+    "en": [
+        "masterpiece, best quality, 1girl, long hair, red dress, smiling",
+        "city at night, neon lights, rain, cinematic lighting",
+        "a small cabin in the forest, early morning, mist. Sunlight falls through the leaves.",
+        "cyberpunk style, mechanical arm, futuristic city, highly detailed",
+    ],
+}
+
+
+def _rss_mb() -> float:
+    """当前进程常驻内存（MB）：优先psutil，否则读取/proc/self/status，均不可用时返回0"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _run_mode(segmentation: str, prompts: list, src: str, tgt: str, profile: str, rounds: int, queue):
+    """子进程：加载插件翻译器，逐条翻译（与节点单条执行一致），记录首轮（含模型加载）与后续各轮延迟、常驻内存增量"""
+    try:
+        sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+        translator_module = importlib.import_module(f"{os.path.basename(PLUGIN_DIR)}.prompt_translator")
+        translator = translator_module.get_translator(profile)
+        base_rss = _rss_mb()
+
+        start = time.perf_counter()
+        for prompt in prompts:
+            translator.translate(prompt, src, tgt, segmentation)
+        first_round = time.perf_counter() - start
+
+        latencies = []
+        for _ in range(rounds):
+            for prompt in prompts:
+                start = time.perf_counter()
+                translator.translate(prompt, src, tgt, segmentation)
+                latencies.append(time.perf_counter() - start)
+        queue.put({
+            "segmentation": segmentation,
+            "first_round": first_round,
+            "mean": statistics.mean(latencies) if latencies else 0.0,
+            "median": statistics.median(latencies) if latencies else 0.0,
+            "rss": _rss_mb() - base_rss,
+            "sample": translator.translate(prompts[0], src, tgt, segmentation),
+        })
+    except Exception as e:
+        queue.put({"segmentation": segmentation, "error": str(e)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比Stanza分句与快速规则分句的翻译延迟与常驻内存")
+    parser.add_argument("prompt_file", nargs="?", default="", help="提示词TXT文件（每行一条），不填使用内置示例")
+    parser.add_argument("--rounds", type=int, default=5, help="计时轮数（首轮含模型加载，单独统计）")
+    parser.add_argument("--profile", default="quality", choices=["fast", "balanced", "quality"], help="性能档位")
+    parser.add_argument("--source", default="zh", choices=["zh", "en"], help="源语言")
+    parser.add_argument("--target", default="en", choices=["zh", "en"], help="目标语言")
+    args = parser.parse_args()
+    if args.source == args.target:
+        parser.error("源语言与目标语言不能相同")
+
+    if args.prompt_file:
+        with open(args.prompt_file, "r", encoding="utf-8") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+    else:
+        prompts = DEFAULT_PROMPTS[args.source]
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for segmentation in ("stanza", "rules"):
+        queue = ctx.Queue()
+        process = ctx.Process(target=_run_mode, args=(
+            segmentation, prompts, args.source, args.target, args.profile, args.rounds, queue
+        ))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    print(f"提示词{len(prompts)}条 | {args.source}→{args.target} | 档位{args.profile} | 计时{args.rounds}轮")
+    for result in results:
+        if "error" in result:
+            print(f"❌ {result['segmentation']}：{result['error']}")
+            continue
+        print(f"{result['segmentation']:>7} | 首轮（含加载）{result['first_round']:.2f}s"
+              f" | 单条平均{result['mean'] * 1000:.1f}ms / 中位{result['median'] * 1000:.1f}ms"
+              f" | 常驻内存增量{result['rss']:.0f}MB | 示例：{result['sample'][:40]}")
+
+
+if __name__ == "__main__":
+    main()
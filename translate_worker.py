@@ -0,0 +1,389 @@
+"""
+👻幻影工具 - 进程外翻译服务
+同一台机器上的多个ComfyUI进程共用一个翻译工作进程（PHANTOM_TRANSLATE_WORKER=1开启）：工作进程独占翻译模型，
+把各客户端同一时间窗内的请求合并为批次推理；首次使用时自动启动，空闲超时后自动退出释放内存，不可用时节点退回进程内翻译
+通信：Unix套接字（Windows为127.0.0.1端口），消息为4字节长度前缀 + UTF-8 JSON
+手动启动：python translate_worker.py --serve [--address unix:/tmp/x.sock | tcp:127.0.0.1:47391] [--idle 0]
+自检（退回进程内翻译、自动启动、跨连接合批）：python translate_worker.py --check
+"""
+import os
+import sys
+import json
+import time
+import queue
+import types
+import signal
+import socket
+import struct
+import hashlib
+import logging
+import argparse
+import importlib
+import tempfile
+import threading
+import subprocess
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 是否使用进程外翻译服务；工作进程自身以server角色运行，不再转发请求
+WORKER_ENABLED = os.environ.get("PHANTOM_TRANSLATE_WORKER", "0") == "1"
+WORKER_ROLE = os.environ.get("PHANTOM_TRANSLATE_WORKER_ROLE", "client")
+# 合并批次的等待时间窗（毫秒）、等待服务启动的最长秒数、服务不可用后暂停重试的秒数、
+# 空闲自动退出秒数（0为不退出；所有ComfyUI退出后不再常驻占用模型内存，下次使用时重新自动启动）
+BATCH_WINDOW_MS = float(os.environ.get("PHANTOM_TRANSLATE_WORKER_BATCH_MS", "10"))
+START_TIMEOUT = float(os.environ.get("PHANTOM_TRANSLATE_WORKER_START_TIMEOUT", "30"))
+RETRY_SECONDS = float(os.environ.get("PHANTOM_TRANSLATE_WORKER_RETRY", "30"))
+IDLE_TIMEOUT = float(os.environ.get("PHANTOM_TRANSLATE_WORKER_IDLE", "600"))
+# 单次请求等待结果的最长秒数（首次请求包含工作进程加载模型）
+REQUEST_TIMEOUT = float(os.environ.get("PHANTOM_TRANSLATE_WORKER_TIMEOUT", "600"))
+
+
+def default_address() -> str:
+    """默认服务地址：POSIX为临时目录下按插件路径区分的Unix套接字（避免路径超长），Windows为本机TCP端口"""
+    configured = os.environ.get("PHANTOM_TRANSLATE_WORKER_ADDRESS", "")
+    if configured:
+        return configured
+    if hasattr(socket, "AF_UNIX") and os.name != "nt":
+        digest = hashlib.sha1(PLUGIN_DIR.encode("utf-8")).hexdigest()[:8]
+        return f"unix:{os.path.join(tempfile.gettempdir(), f'phantom-translate-{digest}.sock')}"
+    return "tcp:127.0.0.1:47391"
+
+
+def _parse_address(address: str) -> Tuple[int, object]:
+    kind, _, target = address.partition(":")
+    if kind == "unix":
+        return socket.AF_UNIX, target
+    host, _, port = target.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def _send_message(sock: socket.socket, message: dict):
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_message(sock: socket.socket) -> dict:
+    size = struct.unpack(">I", _recv_exact(sock, 4))[0]
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+
+# ---------------------------- 客户端（ComfyUI进程） ----------------------------
+class TranslationWorkerClient:
+    """翻译服务客户端：每次请求新建一条本机连接；服务未运行时自动启动，启动失败后暂停重试一段时间"""
+
+    def __init__(self, address: str, enabled: bool, auto_start: bool = True, idle_timeout: float = IDLE_TIMEOUT):
+        self.address = address
+        self.enabled = enabled
+        self.auto_start = auto_start
+        self.idle_timeout = idle_timeout
+        self._spawn_lock = threading.Lock()
+        self._retry_after = 0.0
+
+    def _connect(self, timeout: float) -> socket.socket:
+        family, target = _parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(target)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _spawn_worker(self):
+        log_dir = os.path.join(PLUGIN_DIR, "cache")
+        os.makedirs(log_dir, exist_ok=True)
+        env = dict(os.environ, PHANTOM_TRANSLATE_WORKER_ROLE="server")
+        kwargs = {"start_new_session": True} if os.name != "nt" else {
+            "creationflags": subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
+        }
+        with open(os.path.join(log_dir, "translate_worker.log"), "ab") as log_file:
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--serve", "--address", self.address,
+                 "--idle", str(self.idle_timeout)],
+                cwd=PLUGIN_DIR, env=env, stdin=subprocess.DEVNULL, stdout=log_file, stderr=log_file, **kwargs
+            )
+        logger.info(f"ℹ️ 已启动翻译服务进程：{self.address}")
+
+    def _connect_or_spawn(self) -> socket.socket:
+        try:
+            return self._connect(REQUEST_TIMEOUT)
+        except OSError:
+            if not self.auto_start:
+                raise
+        with self._spawn_lock:
+            try:
+                return self._connect(REQUEST_TIMEOUT)
+            except OSError:
+                self._spawn_worker()
+            deadline = time.monotonic() + START_TIMEOUT
+            while True:
+                try:
+                    return self._connect(REQUEST_TIMEOUT)
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+
+    def translate_batch(self, texts: List[str], src: str, tgt: str, profile: str, segmentation: str,
+                        max_batch_size: int) -> Optional[List[str]]:
+        """请求翻译服务批量翻译；服务不可用（连接、启动或通信失败）时返回None，由调用方退回进程内翻译；
+        服务端翻译出错（如缺少模型文件）时抛出RuntimeError"""
+        if not self.enabled or time.monotonic() < self._retry_after:
+            return None
+        request = {
+            "op": "translate", "texts": texts, "src": src, "tgt": tgt, "profile": profile,
+            "segmentation": segmentation, "max_batch_size": max_batch_size,
+        }
+        try:
+            with self._connect_or_spawn() as sock:
+                _send_message(sock, request)
+                response = _recv_message(sock)
+        except (OSError, ValueError) as e:
+            self._retry_after = time.monotonic() + RETRY_SECONDS
+            logger.warning(f"⚠️ 翻译服务不可用（{str(e)}），{RETRY_SECONDS:.0f}秒内使用进程内翻译")
+            return None
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "翻译服务出错"))
+        return response["results"]
+
+
+WORKER_CLIENT = TranslationWorkerClient(default_address(), WORKER_ENABLED and WORKER_ROLE != "server")
+
+
+# ---------------------------- 服务端（工作进程） ----------------------------
+class _PendingRequest:
+    def __init__(self, key: tuple, texts: List[str]):
+        self.key = key  # (源语言, 目标语言, 档位, 分句方式, 最大批量)
+        self.texts = texts
+        self.results = None
+        self.error = ""
+        self.batch_size = 0  # 合并进同一批次的请求数
+        self.done = threading.Event()
+
+
+class TranslationWorkerServer:
+    """翻译服务：每个连接一个线程接收请求，合批线程把时间窗内同参数的请求拼成一批推理，再按请求拆分结果"""
+
+    def __init__(self, address: str, get_translator, batch_window: float = BATCH_WINDOW_MS / 1000,
+                 idle_timeout: float = IDLE_TIMEOUT):
+        self.address = address
+        self.get_translator = get_translator
+        self.batch_window = batch_window
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue()
+        self._last_active = time.monotonic()
+        self._active = 0  # 处理中的连接数（长时间推理期间不算空闲）
+        self._active_lock = threading.Lock()
+
+    def _bind(self) -> socket.socket:
+        family, target = _parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(target):
+            # 已有服务在运行则退出；否则是上次异常退出残留的套接字文件
+            probe = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                probe.connect(target)
+                raise OSError(f"翻译服务已在运行：{self.address}")
+            except ConnectionError:
+                os.remove(target)
+            finally:
+                probe.close()
+        server = socket.socket(family, socket.SOCK_STREAM)
+        server.bind(target)
+        server.listen(64)
+        return server
+
+    def _batch_loop(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            groups = {}
+            for request in pending:
+                groups.setdefault(request.key, []).append(request)
+            for (src, tgt, profile, segmentation, max_batch_size), requests in groups.items():
+                texts = [text for request in requests for text in request.texts]
+                try:
+                    results = self.get_translator(profile).translate_batch(texts, src, tgt, max_batch_size, segmentation)
+                except Exception as e:
+                    for request in requests:
+                        request.error = str(e)
+                        request.done.set()
+                    continue
+                offset = 0
+                for request in requests:
+                    request.results = results[offset:offset + len(request.texts)]
+                    request.batch_size = len(requests)
+                    offset += len(request.texts)
+                    request.done.set()
+                logger.info(f"ℹ️ 翻译服务 | {src}→{tgt} | 合并{len(requests)}个请求，共{len(texts)}条")
+
+    def _handle_client(self, conn: socket.socket):
+        with conn:
+            try:
+                message = _recv_message(conn)
+                if message.get("op") == "ping":
+                    _send_message(conn, {"ok": True, "pid": os.getpid()})
+                    return
+                key = (message["src"], message["tgt"], message["profile"], message["segmentation"],
+                       int(message["max_batch_size"]))
+                request = _PendingRequest(key, list(message["texts"]))
+                self._queue.put(request)
+                request.done.wait()
+                if request.error:
+                    _send_message(conn, {"ok": False, "error": request.error})
+                else:
+                    _send_message(conn, {"ok": True, "results": request.results, "batch": request.batch_size})
+            except ConnectionError:
+                pass  # 探测连接（如另一工作进程检查服务是否在运行）未发送请求即关闭
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"⚠️ 翻译服务请求处理失败：{str(e)}")
+            finally:
+                with self._active_lock:
+                    self._active -= 1
+                    self._last_active = time.monotonic()
+
+    def serve_forever(self):
+        server = self._bind()
+        threading.Thread(target=self._batch_loop, name="phantom-translate-batch", daemon=True).start()
+        logger.info(f"✅ 翻译服务已启动：{self.address}（pid {os.getpid()}）")
+        server.settimeout(60 if self.idle_timeout <= 0 else min(60, self.idle_timeout))
+        try:
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    with self._active_lock:
+                        idle = self._active == 0 and time.monotonic() - self._last_active > self.idle_timeout
+                    if self.idle_timeout > 0 and idle:
+                        logger.info("ℹ️ 翻译服务空闲超时，退出")
+                        return
+                    continue
+                conn.settimeout(None)
+                with self._active_lock:
+                    self._active += 1
+                    self._last_active = time.monotonic()
+                threading.Thread(target=self._handle_client, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            family, target = _parse_address(self.address)
+            if family == socket.AF_UNIX and os.path.exists(target):
+                os.remove(target)
+
+
+def _load_translator_module():
+    """只导入插件的翻译模块（不执行插件__init__，避免在工作进程中加载torch、cv2等节点依赖）"""
+    package_name = os.path.basename(PLUGIN_DIR)
+    if package_name not in sys.modules:
+        package = types.ModuleType(package_name)
+        package.__path__ = [PLUGIN_DIR]
+        sys.modules[package_name] = package
+    return importlib.import_module(f"{package_name}.prompt_translator")
+
+
+def run_check(profile: str = "quality", clients: int = 8) -> bool:
+    """自检（需已安装翻译模型）：在独立地址上依次检查服务不可用时退回、自动启动工作进程、并发请求合并批次，
+    结束后关闭本次启动的工作进程；返回是否全部通过"""
+    if hasattr(socket, "AF_UNIX") and os.name != "nt":
+        address = f"unix:{os.path.join(tempfile.gettempdir(), f'phantom-translate-check-{os.getpid()}.sock')}"
+    else:
+        address = "tcp:127.0.0.1:47392"
+    request = {"op": "translate", "texts": ["一个女孩，微笑"], "src": "zh", "tgt": "en", "profile": profile,
+               "segmentation": "rules", "max_batch_size": 32}
+    passed = True
+
+    # 1. 服务未运行且不自动启动：返回None，节点退回进程内翻译
+    offline = TranslationWorkerClient(address, True, auto_start=False)
+    fallback = offline.translate_batch(request["texts"], "zh", "en", profile, "rules", 32)
+    print(f"{'✅' if fallback is None else '❌'} 服务不可用时退回进程内翻译")
+    passed &= fallback is None
+
+    # 2. 首次请求自动启动工作进程（含模型加载）
+    client = TranslationWorkerClient(address, True, idle_timeout=60)
+    start = time.perf_counter()
+    try:
+        results = client.translate_batch(request["texts"], "zh", "en", profile, "rules", 32)
+    except RuntimeError as e:
+        results = None
+        print(f"❌ 工作进程翻译出错：{str(e)}")
+    print(f"{'✅' if results else '❌'} 自动启动工作进程并翻译：{results}（{time.perf_counter() - start:.2f}s，"
+          f"日志：{os.path.join(PLUGIN_DIR, 'cache', 'translate_worker.log')}）")
+    if not results:
+        return False
+
+    # 3. 多个连接同时请求：应合并进同一批次推理
+    barrier = threading.Barrier(clients)
+    responses = []
+
+    def send(index: int):
+        with client._connect(REQUEST_TIMEOUT) as sock:
+            barrier.wait()
+            _send_message(sock, dict(request, texts=[f"第{index}只猫，坐着"]))
+            responses.append(_recv_message(sock))
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    largest_batch = max((response.get("batch", 0) for response in responses), default=0)
+    merged = len(responses) == clients and all(response.get("ok") for response in responses) and largest_batch > 1
+    print(f"{'✅' if merged else '❌'} {clients}个并发请求，最大合并批次{largest_batch}个请求")
+    passed &= merged
+
+    # 关闭本次自检启动的工作进程
+    with client._connect(5) as sock:
+        _send_message(sock, {"op": "ping"})
+        pid = _recv_message(sock)["pid"]
+    os.kill(pid, signal.SIGTERM)
+    family, target = _parse_address(address)
+    if family == socket.AF_UNIX and os.path.exists(target):
+        os.remove(target)
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="👻幻影工具 进程外翻译服务")
+    parser.add_argument("--serve", action="store_true", help="以服务方式运行")
+    parser.add_argument("--check", action="store_true", help="自检：退回进程内翻译、自动启动、跨连接合批")
+    parser.add_argument("--address", default=default_address(), help="服务地址：unix:/路径 或 tcp:主机:端口")
+    parser.add_argument("--idle", type=float, default=IDLE_TIMEOUT, help="空闲多少秒后自动退出（0为常驻）")
+    parser.add_argument("--profile", default="quality", choices=["fast", "balanced", "quality"], help="自检使用的性能档位")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(0 if run_check(args.profile) else 1)
+    if not args.serve:
+        parser.print_help()
+        return
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    os.environ["PHANTOM_TRANSLATE_WORKER_ROLE"] = "server"
+    translator_module = _load_translator_module()
+    try:
+        TranslationWorkerServer(args.address, translator_module.get_translator, idle_timeout=args.idle).serve_forever()
+    except OSError as e:
+        logger.info(f"ℹ️ {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
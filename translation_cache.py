@@ -0,0 +1,186 @@
+"""
+👻幻影工具 - 翻译结果两级缓存
+一级：进程内LRU（按条目数）；二级：插件目录下cache/translations.sqlite3，ComfyUI重启后仍可命中
+缓存键：(规范化文本哈希, 源语言, 目标语言, 模型文件哈希)，替换.argosmodel模型文件后旧结果自动失效
+"""
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+import logging
+from collections import OrderedDict
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 缓存容量，可通过环境变量调整
+MEMORY_ENTRIES = int(os.environ.get("PHANTOM_TRANSLATION_CACHE_ENTRIES", "4096"))
+DISK_BUDGET_MB = int(os.environ.get("PHANTOM_TRANSLATION_CACHE_MB", "64"))
+
+
+def _default_db_path() -> str:
+    plugin_root = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(plugin_root, "cache", "translations.sqlite3")
+
+
+def normalize_text(text: str) -> str:
+    """规范化：Unicode NFC、去除每行首尾空白、合并行内连续空格（保留换行结构）"""
+    text = unicodedata.normalize("NFC", text)
+    lines = [re.sub(r"[ \t　]+", " ", line).strip() for line in text.strip().splitlines()]
+    return "\n".join(lines)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """翻译结果缓存：内存LRU + SQLite，磁盘超出预算时按最近使用时间淘汰"""
+
+    def __init__(self, memory_entries: int, disk_budget: int, db_path: str):
+        self.memory_entries = memory_entries
+        self.disk_budget = disk_budget
+        self.db_path = db_path
+        self._memory = OrderedDict()  # (文本哈希, 源语言, 目标语言, 模型哈希) -> 译文
+        self._conn = None
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._prewarmed = set()  # 已预热的(文件路径, 修改时间, 源语言, 目标语言, 模型哈希)
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "disk_evictions": 0}
+
+    # ---------------------------- 二级：SQLite ----------------------------
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """首次访问时打开数据库（调用方持有锁）；打开失败时只使用内存缓存"""
+        if self._conn is None:
+            try:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "text_hash TEXT, src TEXT, tgt TEXT, model_hash TEXT, "
+                    "source_text TEXT, result TEXT, size INTEGER, last_used REAL, "
+                    "PRIMARY KEY (text_hash, src, tgt, model_hash))"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON translations(last_used)")
+                self._disk_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ 翻译缓存数据库不可用：{str(e)}，仅使用内存缓存")
+                self._conn = False
+        return self._conn or None
+
+    def _evict_disk(self, conn: sqlite3.Connection):
+        """超出磁盘预算时删除最久未使用的条目，直到降至预算的90%"""
+        if self._disk_bytes <= self.disk_budget:
+            return
+        target = self.disk_budget * 0.9
+        rows = conn.execute("SELECT rowid, size FROM translations ORDER BY last_used").fetchall()
+        doomed = []
+        for rowid, size in rows:
+            if self._disk_bytes <= target:
+                break
+            doomed.append((rowid,))
+            self._disk_bytes -= size
+        conn.executemany("DELETE FROM translations WHERE rowid = ?", doomed)
+        self.stats["disk_evictions"] += len(doomed)
+
+    # ---------------------------- 对外接口 ----------------------------
+    def get(self, text: str, src: str, tgt: str, model_hash: str) -> Optional[str]:
+        """查询缓存：内存命中直接返回；磁盘命中回填内存并更新使用时间；未命中返回None"""
+        key = (text_hash(text), src, tgt, model_hash)
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return result
+            conn = self._db()
+            row = None
+            if conn is not None:
+                try:
+                    row = conn.execute(
+                        "SELECT result FROM translations WHERE text_hash=? AND src=? AND tgt=? AND model_hash=?", key
+                    ).fetchone()
+                    if row is not None:
+                        conn.execute(
+                            "UPDATE translations SET last_used=? WHERE text_hash=? AND src=? AND tgt=? AND model_hash=?",
+                            (time.time(), *key)
+                        )
+                        conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ 翻译缓存读取失败：{str(e)}")
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._put_memory(key, row[0])
+            return row[0]
+
+    def _put_memory(self, key: tuple, result: str):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, text: str, src: str, tgt: str, model_hash: str, result: str):
+        """写入缓存：内存与SQLite同时写入，磁盘超出预算时淘汰"""
+        normalized = normalize_text(text)
+        key = (hashlib.sha1(normalized.encode("utf-8")).hexdigest(), src, tgt, model_hash)
+        size = len(normalized.encode("utf-8")) + len(result.encode("utf-8")) + 128  # 128：键与行开销估算
+        with self._lock:
+            self._put_memory(key, result)
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                old = conn.execute(
+                    "SELECT size FROM translations WHERE text_hash=? AND src=? AND tgt=? AND model_hash=?", key
+                ).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*key, normalized, result, size, time.time())
+                )
+                self._disk_bytes += size - (old[0] if old else 0)
+                self._evict_disk(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ 翻译缓存写入失败：{str(e)}")
+
+    def prewarm_from_file(self, file_path: str, src: str, tgt: str, model_hash: str,
+                          translate: Callable[[str], str]) -> int:
+        """从文件预热缓存：每行一条提示词；"原文<TAB>译文"格式的行直接写入，其余行未缓存时调用translate翻译。返回新增条目数
+
+        同一文件（修改时间不变）在同一翻译方向与模型下只预热一次
+        """
+        marker = (os.path.abspath(file_path), os.stat(file_path).st_mtime_ns, src, tgt, model_hash)
+        if marker in self._prewarmed:
+            return 0
+        added = 0
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\r\n")
+                source, _, result = line.partition("\t")
+                if not source.strip() or self.get(source, src, tgt, model_hash) is not None:
+                    continue
+                if not result.strip():
+                    result = translate(source.strip())
+                if result.strip():
+                    self.put(source, src, tgt, model_hash, result.strip())
+                    added += 1
+        self._prewarmed.add(marker)
+        return added
+
+    def format_stats(self) -> str:
+        s = self.stats
+        lookups = s["memory_hits"] + s["disk_hits"] + s["misses"]
+        hit_rate = (s["memory_hits"] + s["disk_hits"]) / lookups if lookups else 0.0
+        return (f"命中率{hit_rate:.0%}（内存{s['memory_hits']}/磁盘{s['disk_hits']}/未命中{s['misses']}）"
+                f" | 淘汰：磁盘{s['disk_evictions']} | 占用：内存{len(self._memory)}条/磁盘{self._disk_bytes / 2**20:.1f}MB")
+
+
+# 进程级共享翻译缓存
+TRANSLATION_CACHE = TranslationCache(MEMORY_ENTRIES, DISK_BUDGET_MB * 2**20, _default_db_path())
@@ -0,0 +1,297 @@
+"""
+👻幻影工具 - 视频读取会话与句柄池
+单个句柄完成探测+首帧+尾帧读取，定位索引已知时按关键帧定位，按(路径,大小,修改时间)跨执行复用已打开的VideoCapture
+同一文件可并存多个句柄，首尾帧/采样帧在解码线程池上并行读取（cv2解码时释放GIL）
+线程设置（环境变量）：PHANTOM_DECODE_WORKERS 并行读取线程数（默认2，1为串行）；
+PHANTOM_DECODE_THREADS 每个句柄的FFmpeg解码线程数（默认0，由FFmpeg自动决定）；
+PHANTOM_CV2_THREADS cv2.setNumThreads（默认不修改）。多个ComfyUI实例共用一台机器时调小可避免争抢CPU核心
+"""
+import os
+import atexit
+import bisect
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .video_seek_index import SEEK_INDEX_BUILDER, SEEK_INDEX_STORE, probe_seek_index
+
+DECODE_WORKERS = int(os.environ.get("PHANTOM_DECODE_WORKERS", "2"))
+DECODE_THREADS = int(os.environ.get("PHANTOM_DECODE_THREADS", "0"))
+CV2_THREADS = int(os.environ.get("PHANTOM_CV2_THREADS", "-1"))  # 小于0表示不修改
+
+
+def get_file_key(video_path: str) -> Tuple[str, int, int]:
+    """文件指纹：绝对路径+文件大小+修改时间（纳秒），文件被替换/修改后指纹随之变化"""
+    abs_path = os.path.abspath(video_path)
+    stat = os.stat(abs_path)
+    return (abs_path, stat.st_size, stat.st_mtime_ns)
+
+
+class VideoCaptureSession:
+    """单个视频的CV2读取会话：一次打开，探测/首帧/尾帧共用同一句柄"""
+
+    def __init__(self, video_path: str, file_key: Tuple[str, int, int], decode_threads: int = 0):
+        self.video_path = video_path
+        self.file_key = file_key
+        if decode_threads > 0 and hasattr(cv2, "CAP_PROP_N_THREADS"):
+            # 解码线程数只能在打开时指定
+            self.cap = cv2.VideoCapture(video_path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, decode_threads])
+        else:
+            self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            self.cap.release()
+            raise Exception("CV2无法打开视频")
+        # 探测信息在打开时读取一次，后续复用
+        self.frame_count = max(1, int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        self.fps = float(self.cap.get(cv2.CAP_PROP_FPS) or 0.0)
+        self.position = 0  # 下一次read()将返回的帧序号，-1表示位置未知
+        # 估计关键帧间隔：目标帧距离超过该值才随机定位，否则顺序grab()更快
+        self.keyframe_interval = max(12, int(round(self.fps * 2))) if self.fps > 0 else 50
+        self.keyframes = []  # 已知关键帧序号（升序），建立定位索引后填充
+        self.seek_index = None
+
+    def ensure_seek_index(self) -> bool:
+        """加载定位索引（精确帧数/帧率/关键帧），成功后以索引数据为准；返回是否可用
+        尚未建立时提交后台建立（PyAV需读取整个文件），本次返回False，由调用方使用容器帧数并回退读取尾帧；
+        PyAV不可用或建立失败时在当前线程做CV2尾部扫描"""
+        if self.seek_index is not None:
+            return True
+        try:
+            index = SEEK_INDEX_STORE.get(self.file_key)
+            if index is None:
+                if SEEK_INDEX_BUILDER.schedule(self.video_path, self.file_key):
+                    return False
+                index = probe_seek_index(self.video_path, self.cap, self.frame_count, self.fps, self.keyframe_interval)
+                self.position = -1  # 探测可能移动了读取位置
+                SEEK_INDEX_STORE.put(self.file_key, index)
+                print(f"✅ 已建立定位索引（{index['source']}）| 总帧数：{index['frame_count']} | 关键帧：{len(index['keyframes'])}个")
+        except Exception as e:
+            print(f"⚠️ 定位索引不可用：{str(e)}，使用容器帧数")
+            return False
+        self.seek_index = index
+        self.frame_count = max(1, int(index["frame_count"]))
+        if index["fps"] > 0:
+            self.fps = float(index["fps"])
+        self.keyframes = list(index["keyframes"])
+        if len(self.keyframes) >= 2:
+            gaps = np.diff(self.keyframes)
+            self.keyframe_interval = max(1, int(np.median(gaps)))
+        return True
+
+    def _seek_to(self, frame_idx: int):
+        """将读取位置推进到frame_idx：目标与当前位置在同一GOP（或距离不超过关键帧间隔）时顺序grab()，否则随机定位"""
+        if frame_idx == self.position:
+            return
+        if self.keyframes:
+            k = bisect.bisect_right(self.keyframes, frame_idx) - 1
+            gop_start = self.keyframes[k] if k >= 0 else 0
+            if not (self.position >= 0 and gop_start <= self.position < frame_idx):
+                # 定位到目标所在GOP的关键帧，再顺序解码到目标，只需解码一个GOP
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, gop_start)
+                self.position = gop_start
+        elif not (self.position >= 0 and 0 < frame_idx - self.position <= self.keyframe_interval):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            self.position = frame_idx
+            return
+        # grab()只解码不做颜色转换，比重新定位到上一个关键帧再解码更省
+        while self.position < frame_idx:
+            if not self.cap.grab():
+                self.position = -1
+                raise Exception(f"顺序跳帧至{frame_idx}失败")
+            self.position += 1
+
+    def read_frame(self, frame_idx: int) -> np.ndarray:
+        """读取指定帧：位置已对齐时直接顺序读取，否则先定位"""
+        self._seek_to(frame_idx)
+        ret, frame = self.cap.read()
+        if not ret or frame is None:
+            self.position = -1
+            raise Exception(f"读取帧{frame_idx}失败")
+        self.position = frame_idx + 1
+        return frame
+
+    def read_tail_frame(self, frame_count: int = 0, max_backtrack: int = 3) -> Tuple[int, np.ndarray]:
+        """读取尾帧：优先使用定位索引的精确帧数（从最后一个关键帧顺序解码），
+        索引不可用且frame_count<=0时使用容器帧数，帧数偏大时逐帧回退，返回(实际帧序号, 帧数据)"""
+        if self.ensure_seek_index() or frame_count <= 0:
+            frame_count = self.frame_count
+        last_idx = frame_count - 1
+        for frame_idx in range(last_idx, max(-1, last_idx - max_backtrack - 1), -1):
+            try:
+                return frame_idx, self.read_frame(frame_idx)
+            except Exception:
+                continue
+        raise Exception(f"读取尾帧失败（已回退{max_backtrack}帧）")
+
+    def read_frames(self, frame_indices: List[int], max_backtrack: int = 3) -> List[np.ndarray]:
+        """批量读取：按帧序号升序解码，近距离目标用grab()顺序跳过，间隔超过关键帧间隔才随机定位；按请求顺序返回"""
+        decoded = {}
+        tail_frame = None
+        for frame_idx in sorted(set(frame_indices)):
+            try:
+                decoded[frame_idx] = self.read_frame(frame_idx)
+            except Exception:
+                # 尾部附近读取失败：容器帧数偏大，统一使用实际尾帧
+                if frame_idx < self.frame_count - 1 - max_backtrack:
+                    raise
+                if tail_frame is None:
+                    _, tail_frame = self.read_tail_frame(max_backtrack=max_backtrack)
+                decoded[frame_idx] = tail_frame
+        return [decoded[frame_idx] for frame_idx in frame_indices]
+
+    def iter_frames(self, step: int = 1):
+        """从首帧开始顺序读取，产出(帧序号, 帧)：每step帧read()一帧，其余帧只grab()（不取出像素、不做颜色转换）"""
+        step = max(1, step)
+        self._seek_to(0)
+        frame_idx = 0
+        while True:
+            if frame_idx % step == 0:
+                ret, frame = self.cap.read()
+                if not ret or frame is None:
+                    break
+                self.position = frame_idx + 1
+                yield frame_idx, frame
+            else:
+                if not self.cap.grab():
+                    break
+                self.position = frame_idx + 1
+            frame_idx += 1
+        self.position = -1
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class VideoCapturePool:
+    """已打开句柄的LRU池：取出独占使用、用完归还，淘汰或文件变化时关闭；同一文件最多保留decode_workers个句柄供并行读取"""
+
+    def __init__(self, max_size: int = 8, decode_workers: int = 2, decode_threads: int = 0):
+        self.max_size = max_size
+        self.decode_workers = max(1, decode_workers)
+        self.decode_threads = decode_threads
+        self._sessions = OrderedDict()  # file_key -> [VideoCaptureSession, ...]
+        self._count = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def configure(self, decode_workers: Optional[int] = None, decode_threads: Optional[int] = None,
+                  cv2_threads: Optional[int] = None):
+        """调整线程设置：并行读取线程数、新打开句柄的解码线程数、cv2全局线程数（<0不修改）"""
+        executor = None
+        with self._lock:
+            if decode_workers is not None and max(1, decode_workers) != self.decode_workers:
+                self.decode_workers = max(1, decode_workers)
+                executor, self._executor = self._executor, None
+            if decode_threads is not None:
+                self.decode_threads = decode_threads
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if cv2_threads is not None and cv2_threads >= 0:
+            cv2.setNumThreads(cv2_threads)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix="phantom-decode")
+            return self._executor
+
+    def _checkout(self, video_path: str) -> VideoCaptureSession:
+        file_key = get_file_key(video_path)
+        session = None
+        stale = []
+        with self._lock:
+            idle = self._sessions.get(file_key)
+            if idle:
+                session = idle.pop()
+                self._count -= 1
+                if not idle:
+                    del self._sessions[file_key]
+            # 同一路径但指纹不同：文件已变化，旧句柄作废
+            for key in [k for k in self._sessions if k[0] == file_key[0] and k != file_key]:
+                old = self._sessions.pop(key)
+                self._count -= len(old)
+                stale.extend(old)
+        for old in stale:
+            old.release()
+        if session is None:
+            session = VideoCaptureSession(video_path, file_key, self.decode_threads)
+        return session
+
+    def _checkin(self, session: VideoCaptureSession):
+        evicted = []
+        with self._lock:
+            idle = self._sessions.setdefault(session.file_key, [])
+            self._sessions.move_to_end(session.file_key)
+            if len(idle) >= self.decode_workers:
+                # 并发期间已有足够的同文件句柄归还，多余的直接关闭
+                evicted.append(session)
+            else:
+                idle.append(session)
+                self._count += 1
+                while self._count > self.max_size:
+                    oldest_key = next(iter(self._sessions))
+                    oldest = self._sessions[oldest_key]
+                    evicted.append(oldest.pop(0))
+                    self._count -= 1
+                    if not oldest:
+                        del self._sessions[oldest_key]
+        for old in evicted:
+            old.release()
+
+    @contextmanager
+    def session(self, video_path: str):
+        """取出读取会话；正常结束归还池中，出现异常则关闭句柄（下次重新打开）"""
+        session = self._checkout(video_path)
+        ok = False
+        try:
+            yield session
+            ok = True
+        finally:
+            if ok:
+                self._checkin(session)
+            else:
+                session.release()
+
+    def submit(self, fn, *args):
+        """提交到解码线程池执行"""
+        return self._get_executor().submit(fn, *args)
+
+    def read_frames_parallel(self, video_path: str, frame_indices: List[int], max_backtrack: int = 3) -> List[np.ndarray]:
+        """并行批量读取：升序帧序号按位置切成decode_workers段，每段在独立句柄上顺序解码；按请求顺序返回"""
+        unique = sorted(set(frame_indices))
+        chunk_count = max(1, min(self.decode_workers, len(unique)))
+        chunk_size = -(-len(unique) // chunk_count)
+        chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+
+        def read_chunk(chunk: List[int]) -> Dict[int, np.ndarray]:
+            with self.session(video_path) as session:
+                session.ensure_seek_index()
+                return dict(zip(chunk, session.read_frames(chunk, max_backtrack)))
+
+        # 第一段在当前线程读取，其余段交给解码线程池
+        futures = [self.submit(read_chunk, chunk) for chunk in chunks[1:]]
+        decoded = read_chunk(chunks[0])
+        for future in futures:
+            decoded.update(future.result())
+        return [decoded[frame_idx] for frame_idx in frame_indices]
+
+    def close_all(self):
+        with self._lock:
+            sessions = [s for idle in self._sessions.values() for s in idle]
+            self._sessions.clear()
+            self._count = 0
+        for session in sessions:
+            session.release()
+
+
+# 进程级共享句柄池
+CAPTURE_POOL = VideoCapturePool(decode_workers=DECODE_WORKERS, decode_threads=DECODE_THREADS)
+CAPTURE_POOL.configure(cv2_threads=CV2_THREADS)
+atexit.register(CAPTURE_POOL.close_all)
@@ -0,0 +1,199 @@
+"""
+👻幻影工具 - 视频文件夹首尾帧批量获取节点
+目录/通配符批量输入，多进程并行提取每个视频的首尾帧；结果以列表输出，或直接保存为图片文件夹+清单
+单个文件失败只记录到报告，不中断整批处理
+"""
+import os
+import glob
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+from .frame_convert import frames_to_image
+from .video_frame_extract_node import VideoFrameExtractNode
+from .video_source_registry import VIDEO_EXTENSIONS
+
+def _list_videos(source: str) -> List[str]:
+    """目录：列出目录下的视频文件；否则按通配符匹配（支持**递归）"""
+    source = source.strip().strip('"')
+    if os.path.isdir(source):
+        candidates = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        candidates = glob.glob(source, recursive=True)
+    return sorted(p for p in candidates if os.path.isfile(p) and p.lower().endswith(VIDEO_EXTENSIONS))
+
+
+def _output_names(video_paths: List[str]) -> Dict[str, str]:
+    """保存模式的图片名前缀：视频相对于共同上级目录的路径（保留扩展名），
+    同名不同格式（a.mp4/a.mkv）或不同子目录（**递归）的视频互不覆盖，子目录结构在保存目录下保留"""
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in video_paths])
+    return {path: os.path.relpath(os.path.abspath(path), root) for path in video_paths}
+
+
+def extract_video_job(video_path: str, resize: Tuple[int, float], save_dir: Optional[str],
+                      output_name: str = "") -> dict:
+    """单个视频的提取任务（在工作进程中执行）：保存模式下直接写图片，只回传文件名，避免跨进程传输帧数据；
+    列表模式回传uint8帧（数据量为float32的1/4），由主进程转换为IMAGE"""
+    node = VideoFrameExtractNode()
+    try:
+        first_frame, last_frame = node._process_video_path(video_path, dtype_name="uint8", resize=resize)
+        if not save_dir:
+            return {"video": video_path, "ok": True, "first": first_frame, "last": last_frame}
+        output_name = output_name or os.path.basename(video_path)
+        os.makedirs(os.path.dirname(os.path.join(save_dir, output_name)), exist_ok=True)
+        saved = {}
+        for name, frame in (("first", first_frame), ("last", last_frame)):
+            file_name = f"{output_name}_{name}.png"
+            # RGB uint8 → BGR写盘
+            if not cv2.imwrite(os.path.join(save_dir, file_name), frame[0].numpy()[..., ::-1]):
+                raise Exception(f"图片写入失败：{file_name}")
+            saved[name] = file_name
+        return {"video": video_path, "ok": True, **saved}
+    except Exception as e:
+        return {"video": video_path, "ok": False, "error": str(e)}
+
+
+def _create_process_pool(workers: int) -> ProcessPoolExecutor:
+    """创建本批任务的进程池（批次结束即关闭，工作进程不在ComfyUI空闲时常驻占用内存）
+
+    工作进程以spawn方式启动（ComfyUI进程内有其他线程，fork可能继承被持有的锁而死锁），
+    启动时以插件目录注册包模块（不执行插件__init__，只导入提取任务用到的视频模块，不加载翻译等其他节点），
+    改为单线程解码（已按进程并行，避免线程数超过CPU核心），并关闭帧缓存的内存层与磁盘写入
+    （批量任务的帧不挤占交互使用的缓存，已有的磁盘缓存仍可命中）
+    """
+    plugin_dir = os.path.dirname(os.path.abspath(__file__))
+    bootstrap = (
+        f"import sys, types, importlib\n"
+        f"package = types.ModuleType({__package__!r})\n"
+        f"package.__path__ = [{plugin_dir!r}]\n"
+        f"sys.modules.setdefault({__package__!r}, package)\n"
+        f"pool = importlib.import_module({__package__ + '.video_capture_pool'!r}).CAPTURE_POOL\n"
+        f"pool.configure(decode_workers=1, decode_threads=1, cv2_threads=1)\n"
+        f"cache = importlib.import_module({__package__ + '.video_frame_cache'!r}).FRAME_CACHE\n"
+        f"cache.memory_budget = 0\n"
+        f"cache.disk_budget = 0"
+    )
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=exec, initargs=(bootstrap,))
+
+
+class VideoFolderFrameExtractNode:
+    # 节点核心配置
+    CATEGORY = "👻幻影工具"
+    FUNCTION = "extract_folder_frames"
+    RETURN_TYPES = ("IMAGE", "IMAGE", "STRING", "STRING")
+    RETURN_NAMES = ("首帧列表", "尾帧列表", "文件名列表", "处理报告")
+    OUTPUT_IS_LIST = (True, True, True, False)
+    OUTPUT_NODE = True
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "视频目录": ("STRING", {
+                    "default": "",
+                    "tooltip": "视频所在文件夹，或通配符（如D:\\videos\\**\\*.mp4，**表示递归子目录），支持mp4/avi/mov/mkv/flv"
+                }),
+                "并行进程数": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 128,
+                    "step": 1,
+                    "tooltip": "0为自动（CPU核心数）；1为在当前进程内逐个处理"
+                }),
+                "输出方式": (["列表输出", "保存到文件夹"], {
+                    "default": "列表输出",
+                    "tooltip": "列表输出：首尾帧以IMAGE列表返回；保存到文件夹：写出PNG与manifest.json，不占用显存/内存"
+                }),
+            },
+            "optional": {
+                "保存目录": ("STRING", {
+                    "default": "",
+                    "tooltip": "保存到文件夹模式的输出目录，留空则为视频目录下的frames文件夹"
+                }),
+                "输出最长边": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 16384,
+                    "step": 8,
+                    "tooltip": "缩小输出：限制输出最长边像素（0为不限制）"
+                }),
+                "输出缩放比例": ("FLOAT", {
+                    "default": 1.0,
+                    "min": 0.01,
+                    "max": 1.0,
+                    "step": 0.01,
+                    "tooltip": "缩小输出：按比例缩小（1.0为原尺寸）"
+                }),
+            }
+        }
+
+    def _run_jobs(self, video_paths: List[str], workers: int, resize: Tuple[int, float], save_dir: Optional[str]) -> List[dict]:
+        """分发任务：多进程并行，结果按完成顺序收集，全部完成后关闭进程池；进程池不可用时退回当前进程逐个处理"""
+        names = _output_names(video_paths) if save_dir else {}
+        results = {}
+        if workers > 1 and len(video_paths) > 1:
+            try:
+                with _create_process_pool(workers) as pool:
+                    futures = {pool.submit(extract_video_job, path, resize, save_dir, names.get(path, "")): path
+                               for path in video_paths}
+                    for done_count, future in enumerate(as_completed(futures), start=1):
+                        result = future.result()
+                        results[futures[future]] = result
+                        status = "✅" if result["ok"] else "❌"
+                        print(f"{status} [{done_count}/{len(video_paths)}] {os.path.basename(futures[future])}")
+            except (BrokenProcessPool, OSError, RuntimeError) as e:
+                print(f"⚠️ 进程池不可用：{str(e)}，改为当前进程逐个处理")
+        for path in video_paths:
+            if path not in results:
+                results[path] = extract_video_job(path, resize, save_dir, names.get(path, ""))
+        return [results[path] for path in video_paths]
+
+    def extract_folder_frames(self, 视频目录, 并行进程数=0, 输出方式="列表输出", 保存目录="", 输出最长边=0, 输出缩放比例=1.0):
+        video_paths = _list_videos(视频目录)
+        if not video_paths:
+            raise Exception(f"未找到视频文件：{视频目录}")
+
+        workers = 并行进程数 if 并行进程数 > 0 else (os.cpu_count() or 1)
+        workers = min(workers, len(video_paths))
+        resize = (int(输出最长边), float(输出缩放比例))
+        save_dir = None
+        if 输出方式 == "保存到文件夹":
+            base_dir = 视频目录 if os.path.isdir(视频目录) else os.path.dirname(video_paths[0])
+            save_dir = 保存目录.strip() or os.path.join(base_dir, "frames")
+            os.makedirs(save_dir, exist_ok=True)
+        print(f"✅ 共{len(video_paths)}个视频，{workers}个进程并行处理")
+
+        results = self._run_jobs(video_paths, workers, resize, save_dir)
+        succeeded = [r for r in results if r["ok"]]
+        failed = [r for r in results if not r["ok"]]
+        report_lines = [f"成功{len(succeeded)}个，失败{len(failed)}个"]
+        report_lines += [f"❌ {r['video']}：{r['error']}" for r in failed]
+
+        if save_dir:
+            manifest = [{"video": r["video"], "first": r.get("first"), "last": r.get("last"), "error": r.get("error")}
+                        for r in results]
+            manifest_path = os.path.join(save_dir, "manifest.json")
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            report_lines.insert(1, f"已保存至：{save_dir}（清单：manifest.json）")
+            return ([], [], [os.path.basename(r["video"]) for r in succeeded], "\n".join(report_lines))
+
+        def to_image(frame):
+            return frames_to_image(list(frame.numpy()), "float32", bgr=False)
+
+        return ([to_image(r["first"]) for r in succeeded], [to_image(r["last"]) for r in succeeded],
+                [os.path.basename(r["video"]) for r in succeeded], "\n".join(report_lines))
+
+
+# 节点注册（与__init__.py保持一致）
+NODE_CLASS_MAPPINGS = {
+    "VideoFolderFrameExtractNode": VideoFolderFrameExtractNode
+}
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "VideoFolderFrameExtractNode": "视频文件夹首尾帧批量获取"
+}
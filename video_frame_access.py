@@ -0,0 +1,77 @@
+"""
+👻幻影工具 - 按需取帧协议
+包装get_frame/__getitem__等逐帧接口：只读取真正需要的帧序号，不再整段读取后堆叠
+尾帧直接读取失败（帧数不准）时，退回有界流式扫描，仅用环形缓冲保留最后一帧
+"""
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+import torch
+
+
+class LazyFrameSequence:
+    """按需取帧的帧序列：支持len()与正负索引，兼容采样/首尾帧读取逻辑"""
+
+    def __init__(self, fetch: Callable[[int], object], frame_count: int, max_scan: int = 1000, max_backtrack: int = 3):
+        self._fetch = fetch
+        self.frame_count = frame_count
+        self.max_scan = max_scan  # 流式扫描最多读取的帧数，避免卡死
+        self.max_backtrack = max_backtrack
+        self._tail = None  # (尾帧序号, 尾帧数据)，扫描确定后复用
+        self._last = None  # 最近读取的(帧序号, 帧数据)：连续读取同一帧（如探测有效性后再取首帧）时直接复用
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    def _fetch_frame(self, frame_idx: int) -> Optional[np.ndarray]:
+        if self._last is not None and self._last[0] == frame_idx:
+            return self._last[1]
+        try:
+            frame = self._fetch(frame_idx)
+        except Exception:
+            return None
+        # 单帧tensor只转换这一帧，不触及整段序列
+        if isinstance(frame, torch.Tensor):
+            frame = frame.detach().cpu().numpy()
+        if isinstance(frame, np.ndarray) and len(frame.shape) == 3:
+            self._last = (frame_idx, frame)
+            return frame
+        return None
+
+    def _scan_tail(self) -> np.ndarray:
+        """定位真实尾帧：先从声明帧数逐帧回退，失败再从头有界流式扫描（只保留最后一帧）"""
+        last_idx = self.frame_count - 1
+        for frame_idx in range(last_idx - 1, max(-1, last_idx - self.max_backtrack - 1), -1):
+            frame = self._fetch_frame(frame_idx)
+            if frame is not None:
+                self._tail = (frame_idx, frame)
+                break
+        else:
+            ring = deque(maxlen=1)
+            for frame_idx in range(min(self.frame_count, self.max_scan)):
+                frame = self._fetch_frame(frame_idx)
+                if frame is None:
+                    break
+                ring.append((frame_idx, frame))
+            if not ring:
+                raise Exception("流式扫描未读取到任何有效帧")
+            self._tail = ring[-1]
+        print(f"⚠️ 声明帧数{self.frame_count}不准确，实际尾帧序号：{self._tail[0]}")
+        self.frame_count = self._tail[0] + 1
+        return self._tail[1]
+
+    def __getitem__(self, frame_idx: int) -> np.ndarray:
+        if frame_idx < 0:
+            frame_idx += self.frame_count
+        if not 0 <= frame_idx < self.frame_count:
+            raise IndexError(f"帧序号{frame_idx}超出范围（总帧数{self.frame_count}）")
+        if self._tail is not None and frame_idx >= self._tail[0]:
+            return self._tail[1]
+        frame = self._fetch_frame(frame_idx)
+        if frame is not None:
+            return frame
+        # 尾部附近读取失败：声明帧数偏大，统一使用实际尾帧
+        if frame_idx >= self.frame_count - 1 - self.max_backtrack:
+            return self._scan_tail()
+        raise Exception(f"读取帧{frame_idx}失败")
@@ -0,0 +1,183 @@
+"""
+👻幻影工具 - 视频帧两级缓存
+一级：进程内LRU（按字节预算），缓存转换完成的IMAGE张量
+二级：磁盘uint8原始帧（np.memmap读取），ComfyUI重启后仍可命中
+缓存键：(路径, 文件大小, 修改时间, 帧序号, 输出尺寸, 输出精度)，文件变化后自动失效
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import torch
+
+# 缓存预算（MB），可通过环境变量调整
+MEMORY_BUDGET_MB = int(os.environ.get("PHANTOM_FRAME_CACHE_MB", "512"))
+DISK_BUDGET_MB = int(os.environ.get("PHANTOM_FRAME_DISK_CACHE_MB", "2048"))
+
+
+def _default_cache_dir() -> str:
+    plugin_root = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(plugin_root, "cache", "frames")
+
+
+class FrameCache:
+    """首尾帧两级缓存：内存LRU存放IMAGE张量，磁盘存放uint8原始帧"""
+
+    def __init__(self, memory_budget: int, disk_budget: int, disk_dir: str):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.disk_dir = disk_dir
+        self._memory = OrderedDict()  # (路径,大小,修改时间,帧序号,尺寸标记,精度) -> IMAGE张量
+        self._memory_bytes = 0
+        self._disk_index = None  # 文件名 -> 字节数，首次访问磁盘时扫描建立
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "memory_evictions": 0, "disk_evictions": 0,
+        }
+
+    # ---------------------------- 一级：内存LRU ----------------------------
+    def _put_memory(self, mem_key: tuple, tensor: torch.Tensor):
+        size = tensor.element_size() * tensor.nelement()
+        if size > self.memory_budget:
+            return
+        with self._lock:
+            old = self._memory.pop(mem_key, None)
+            if old is not None:
+                self._memory_bytes -= old.element_size() * old.nelement()
+            self._memory[mem_key] = tensor
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_budget and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.element_size() * evicted.nelement()
+                self.stats["memory_evictions"] += 1
+
+    # ---------------------------- 二级：磁盘memmap ----------------------------
+    @staticmethod
+    def _disk_prefix(file_key: Tuple[str, int, int], frame_idx: int) -> str:
+        """同一帧各输出尺寸共用的文件名前缀"""
+        return hashlib.sha1(repr((*file_key, frame_idx)).encode("utf-8")).hexdigest()
+
+    def _disk_name(self, file_key: Tuple[str, int, int], frame_idx: int, size_tag: str) -> str:
+        prefix = self._disk_prefix(file_key, frame_idx)
+        if not size_tag:
+            return f"{prefix}.npy"
+        return f"{prefix}-{hashlib.sha1(size_tag.encode('utf-8')).hexdigest()[:12]}.npy"
+
+    def _ensure_disk_index(self):
+        if self._disk_index is not None:
+            return
+        os.makedirs(self.disk_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith(".npy"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        # 按修改时间排序，最旧的优先淘汰
+        self._disk_index = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._disk_bytes = sum(self._disk_index.values())
+
+    def _load_disk(self, file_key: Tuple[str, int, int], frame_idx: int, size_tag: str) -> Optional[np.ndarray]:
+        name = self._disk_name(file_key, frame_idx, size_tag)
+        with self._lock:
+            self._ensure_disk_index()
+            if name not in self._disk_index:
+                return None
+            self._disk_index.move_to_end(name)
+        try:
+            return np.load(os.path.join(self.disk_dir, name), mmap_mode="r")
+        except Exception:
+            with self._lock:
+                self._disk_bytes -= self._disk_index.pop(name, 0)
+            return None
+
+    def _put_disk(self, file_key: Tuple[str, int, int], frame_idx: int, frame: np.ndarray, size_tag: str):
+        if frame.dtype != np.uint8 or frame.nbytes > self.disk_budget:
+            return
+        name = self._disk_name(file_key, frame_idx, size_tag)
+        path = os.path.join(self.disk_dir, name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with self._lock:
+                self._ensure_disk_index()
+            out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=frame.shape)
+            out[...] = frame
+            out.flush()
+            del out
+            os.replace(tmp_path, path)  # 原子替换，避免并发读取到半写文件
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        evicted = []
+        with self._lock:
+            self._disk_bytes -= self._disk_index.pop(name, 0)
+            self._disk_index[name] = os.path.getsize(path)
+            self._disk_bytes += self._disk_index[name]
+            while self._disk_bytes > self.disk_budget and len(self._disk_index) > 1:
+                old_name, old_size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= old_size
+                evicted.append(old_name)
+                self.stats["disk_evictions"] += 1
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.disk_dir, old_name))
+            except OSError:
+                pass
+
+    # ---------------------------- 对外接口 ----------------------------
+    def get(self, file_key: Tuple[str, int, int], frame_idx: int, dtype_name: str,
+            convert: Callable[[np.ndarray], torch.Tensor], size_tag: str = "") -> Optional[torch.Tensor]:
+        """查询缓存：内存命中直接返回；磁盘命中则用convert转换后回填内存；未命中返回None
+
+        size_tag标记缩小输出的尺寸设置（原尺寸为空），磁盘中保存的是该尺寸下的uint8帧
+        """
+        mem_key = (*file_key, frame_idx, size_tag, dtype_name)
+        with self._lock:
+            tensor = self._memory.get(mem_key)
+            if tensor is not None:
+                self._memory.move_to_end(mem_key)
+                self.stats["memory_hits"] += 1
+                return tensor
+        frame = self._load_disk(file_key, frame_idx, size_tag)
+        if frame is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        tensor = convert(frame)
+        with self._lock:
+            self.stats["disk_hits"] += 1
+        self._put_memory(mem_key, tensor)
+        return tensor
+
+    def put(self, file_key: Tuple[str, int, int], frame_idx: int, dtype_name: str,
+            frame: np.ndarray, tensor: torch.Tensor, size_tag: str = ""):
+        """写入缓存：IMAGE张量进内存，uint8像素帧（已按size_tag缩小）落盘"""
+        self._put_memory((*file_key, frame_idx, size_tag, dtype_name), tensor)
+        self._put_disk(file_key, frame_idx, frame, size_tag)
+
+    def has_frame(self, file_key: Tuple[str, int, int], frame_idx: int) -> bool:
+        """该帧是否已有缓存（任意输出尺寸/精度），不计入命中统计"""
+        prefix = (*file_key, frame_idx)
+        with self._lock:
+            if any(key[:len(prefix)] == prefix for key in self._memory):
+                return True
+            self._ensure_disk_index()
+            prefix = self._disk_prefix(file_key, frame_idx)
+            return any(name.startswith(prefix) for name in self._disk_index)
+
+    def format_stats(self) -> str:
+        s = self.stats
+        lookups = s["memory_hits"] + s["disk_hits"] + s["misses"]
+        hit_rate = (s["memory_hits"] + s["disk_hits"]) / lookups if lookups else 0.0
+        return (f"命中率{hit_rate:.0%}（内存{s['memory_hits']}/磁盘{s['disk_hits']}/未命中{s['misses']}）"
+                f" | 淘汰：内存{s['memory_evictions']}/磁盘{s['disk_evictions']}"
+                f" | 占用：内存{self._memory_bytes / 2**20:.1f}MB/磁盘{self._disk_bytes / 2**20:.1f}MB")
+
+
+# 进程级共享帧缓存
+FRAME_CACHE = FrameCache(MEMORY_BUDGET_MB * 2**20, DISK_BUDGET_MB * 2**20, _default_cache_dir())
@@ -1,345 +1,499 @@
-"""
-👻幻影工具 - 视频首尾帧获取节点
-最终修复版：兼容VideoFromFile/VideoFromComponents，优先调用官方方法获取帧，解决无有效帧数据异常
-"""
-import cv2
-import numpy as np
-import torch
-import os
-import warnings
-from typing import Tuple
-
-# 忽略无关警告，避免日志刷屏
-warnings.filterwarnings("ignore")
-
-class VideoFrameExtractNode:
-    # 节点核心配置
-    CATEGORY = "👻幻影工具"
-    FUNCTION = "extract_first_last_frame"
-    RETURN_TYPES = ("IMAGE", "IMAGE")
-    RETURN_NAMES = ("首帧图像", "尾帧图像")
-    OUTPUT_NODE = True  # 支持预览
-
-    @classmethod
-    def INPUT_TYPES(cls):
-        return {
-            "required": {
-                "视频路径": ("STRING", {
-                    "default": "",
-                    "tooltip": "可选-视频文件路径（优先级高于视频输入端口），支持mp4/avi/mov/mkv/flv格式"
-                })
-            },
-            "optional": {
-                "视频": ("*", {
-                    "forceInput": False,
-                    "tooltip": "可选连-ComfyUI视频对象（VideoFromFile/VideoFromComponents/ndarray帧序列）"
-                })
-            }
-        }
-
-    def _cv2frame2comfy(self, frame: np.ndarray) -> torch.Tensor:
-        """cv2帧转ComfyUI标准IMAGE格式（float32/0-1/[1,H,W,3]）"""
-        if frame is None or frame.size == 0:
-            raise Exception("无法获取有效帧数据")
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if frame.shape[-1] == 3 else frame
-        frame_norm = frame_rgb.astype(np.float32) / 255.0
-        return torch.from_numpy(np.expand_dims(frame_norm, axis=0))
-
-    def _get_video_path(self, video_obj) -> str:
-        """从VideoFromFile提取有效视频文件路径（兜底逻辑）"""
-        video_path = None
-        if hasattr(video_obj, 'get_stream_source'):
-            try:
-                src = video_obj.get_stream_source()
-                if isinstance(src, str) and os.path.exists(src) and src.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv')):
-                    video_path = src
-            except:
-                pass
-        if not video_path:
-            for attr in dir(video_obj):
-                if attr.startswith('_'):
-                    continue
-                try:
-                    val = getattr(video_obj, attr)
-                    if isinstance(val, str) and os.path.exists(val) and val.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv')):
-                        video_path = val
-                        break
-                except:
-                    pass
-        return video_path
-
-    def _read_cv2_frame(self, video_path: str, frame_idx: int) -> np.ndarray:
-        """CV2读取指定帧，重试+资源释放，解决IO连接异常"""
-        for retry in range(2):
-            cap = None
-            try:
-                cap = cv2.VideoCapture(video_path)
-                if not cap.isOpened():
-                    raise Exception("CV2无法打开视频")
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx - 1 if frame_idx > 0 else 0)
-                ret, frame = cap.read()
-                if ret and frame is not None:
-                    return frame
-                else:
-                    raise Exception(f"读取帧{frame_idx}失败")
-            except Exception as e:
-                if retry == 1:
-                    raise Exception(f"重试后仍无法读取帧{frame_idx}：{str(e)}")
-            finally:
-                if cap:
-                    cap.release()
-        return None
-
-    def _scan_nested_obj(self, obj, frame_attrs, depth=0):
-        """递归扫描嵌套对象，提取帧数据（核心修复：处理多层嵌套）"""
-        video_frames = None
-        max_depth = 3  # 限制递归深度，避免死循环
-        if depth > max_depth:
-            return None
-        
-        # 直接匹配tensor/ndarray且维度为4（帧数,H,W,3）
-        if isinstance(obj, (np.ndarray, torch.Tensor)) and len(obj.shape) == 4:
-            return obj
-        
-        # 扫描当前对象的指定属性
-        for attr in frame_attrs:
-            if hasattr(obj, attr):
-                try:
-                    val = getattr(obj, attr)
-                    # 匹配帧数据格式
-                    if isinstance(val, (np.ndarray, torch.Tensor)) and len(val.shape) == 4:
-                        print(f"✅ 从嵌套属性.{attr}（深度{depth}）提取到帧数据 | shape：{val.shape}")
-                        return val
-                    # 非帧数据但为对象/字典，继续递归
-                    elif isinstance(val, (object, dict)) and not isinstance(val, (str, int, float, bool)):
-                        nested_frames = self._scan_nested_obj(val, frame_attrs, depth + 1)
-                        if nested_frames is not None:
-                            return nested_frames
-                except:
-                    continue
-        
-        # 处理字典类型的嵌套（部分自定义实现会用字典存储components）
-        if isinstance(obj, dict):
-            for key, val in obj.items():
-                if key in frame_attrs:
-                    if isinstance(val, (np.ndarray, torch.Tensor)) and len(val.shape) == 4:
-                        print(f"✅ 从字典key.{key}（深度{depth}）提取到帧数据 | shape：{val.shape}")
-                        return val
-                elif isinstance(val, (object, dict)) and not isinstance(val, (str, int, float, bool)):
-                    nested_frames = self._scan_nested_obj(val, frame_attrs, depth + 1)
-                    if nested_frames is not None:
-                        return nested_frames
-        return None
-
-    def _extract_from_components(self, comp_obj) -> Tuple[torch.Tensor, torch.Tensor]:
-        """从VideoFromComponents提取帧序列：强化递归扫描+全链路兜底"""
-        video_frames = None
-
-        # ====================== 第一步：优先调用官方方法获取帧 ======================
-        try:
-            # 1. 获取总帧数，验证视频有效性
-            total_frames = comp_obj.get_frame_count()
-            if total_frames <= 0:
-                raise Exception("VideoFromComponents返回总帧数为0")
-            
-            # 2. 递归扫描get_components()返回值（核心修复：处理嵌套结构）
-            components = comp_obj.get_components()
-            if components:
-                frame_attrs = ["frames", "frame_data", "video_frames", "video_data", "tensor", "data"]
-                video_frames = self._scan_nested_obj(components, frame_attrs)
-            
-            # 3. 兜底1：调用get_frame逐帧读取（标准接口）
-            if video_frames is None and hasattr(comp_obj, 'get_frame'):
-                print("⚠️ 未从components提取到帧，尝试get_frame逐帧读取")
-                frame_list = []
-                max_read_frames = min(total_frames, 1000)  # 限制最大读取数，避免卡死
-                for idx in range(max_read_frames):
-                    frame = comp_obj.get_frame(idx)
-                    if frame is None:
-                        break  # 帧读取失败则终止
-                    # 统一格式为ndarray
-                    if isinstance(frame, torch.Tensor):
-                        frame = frame.cpu().numpy()
-                    if isinstance(frame, np.ndarray) and len(frame.shape) == 3:
-                        frame_list.append(frame)
-                if frame_list:
-                    video_frames = np.stack(frame_list)
-                    print(f"✅ 逐帧读取完成，共获取{len(frame_list)}帧 | shape：{video_frames.shape}")
-                else:
-                    raise Exception("get_frame逐帧读取无有效数据")
-            
-            # 4. 兜底2：尝试__getitem__索引读取（兼容自定义实现）
-            if video_frames is None and hasattr(comp_obj, '__getitem__'):
-                print("⚠️ get_frame读取失败，尝试__getitem__索引读取")
-                frame_list = []
-                max_read_frames = min(total_frames, 1000)
-                for idx in range(max_read_frames):
-                    try:
-                        frame = comp_obj[idx]
-                        if isinstance(frame, torch.Tensor):
-                            frame = frame.cpu().numpy()
-                        if isinstance(frame, np.ndarray) and len(frame.shape) == 3:
-                            frame_list.append(frame)
-                        else:
-                            break
-                    except:
-                        break
-                if frame_list:
-                    video_frames = np.stack(frame_list)
-                    print(f"✅ 索引读取完成，共获取{len(frame_list)}帧 | shape：{video_frames.shape}")
-                else:
-                    raise Exception("__getitem__索引读取无有效数据")
-
-        except Exception as e:
-            raise Exception(f"调用官方方法失败：{str(e)}")
-
-        # ====================== 第二步：全属性扫描（最终兜底） ======================
-        if video_frames is None:
-            frame_candidate_attrs = []
-            # 递归扫描所有属性（含嵌套），便于定位帧数据（移除调试日志打印）
-            def print_nested_attr(obj, prefix="", depth=0):
-                nonlocal frame_candidate_attrs
-                if depth > 3:
-                    return
-                for attr in dir(obj):
-                    if attr.startswith('_'):
-                        continue
-                    try:
-                        val = getattr(obj, attr)
-                        # 筛选疑似帧属性
-                        if (isinstance(val, (np.ndarray, torch.Tensor)) and
-                                len(getattr(val, 'shape', [])) in [3, 4]):
-                            frame_candidate_attrs.append(f"{prefix.strip()}{attr}")
-                            if video_frames is None:
-                                video_frames = val
-                        # 递归扫描子对象
-                        if isinstance(val, (object, dict)) and not isinstance(val, (str, int, float, bool)):
-                            print_nested_attr(val, prefix + "  └─", depth + 1)
-                    except Exception as e:
-                        continue
-
-            print_nested_attr(comp_obj)
-
-        # ====================== 第三步：校验与解析 ======================
-        # 无匹配属性的兜底
-        if video_frames is None:
-            if frame_candidate_attrs:
-                raise Exception(f"未匹配到有效帧序列！疑似帧属性：{frame_candidate_attrs}，请检查维度是否为(帧数,H,W,3)")
-            else:
-                raise Exception("未找到任何疑似帧属性，VideoFromComponents对象无有效帧数据")
-
-        # 格式转换与维度校验
-        try:
-            # tensor转ndarray（CPU）
-            if isinstance(video_frames, torch.Tensor):
-                video_frames = video_frames.cpu().numpy()
-            # 3维单帧自动补为4维多帧
-            if len(video_frames.shape) == 3 and video_frames.shape[-1] == 3:
-                video_frames = np.expand_dims(video_frames, axis=0)
-                print(f"⚠️ 单帧自动补为4维，新shape：{video_frames.shape}")
-            # 必须是4维帧序列（帧数,H,W,3）
-            if len(video_frames.shape) != 4:
-                raise Exception(f"帧序列维度错误！预期4维(帧数,H,W,3)，实际{len(video_frames.shape)}维，shape：{video_frames.shape}")
-            # 提取首尾帧
-            first_frame = self._cv2frame2comfy(video_frames[0])
-            last_frame = self._cv2frame2comfy(video_frames[-1])
-            return (first_frame, last_frame)
-        except Exception as e:
-            raise Exception(f"帧序列解析失败：{str(e)}")
-
-    def _process_video_path(self, video_path: str) -> Tuple[torch.Tensor, torch.Tensor]:
-        """处理视频路径输入，读取首尾帧"""
-        if not video_path or not os.path.exists(video_path):
-            raise Exception("视频路径无效或不存在")
-        if not video_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv')):
-            raise Exception("不支持的视频格式，仅支持mp4/avi/mov/mkv/flv")
-        
-        # 获取总帧数
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise Exception("无法打开视频文件")
-        total_frames = max(1, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
-        cap.release()
-        
-        # 读取首尾帧
-        first_frame = self._read_cv2_frame(video_path, 0)
-        last_frame = self._read_cv2_frame(video_path, max(0, total_frames - 1))
-        
-        if first_frame is None:
-            raise Exception("无法读取视频首帧")
-        if last_frame is None:
-            raise Exception("无法读取视频尾帧")
-            
-        return (self._cv2frame2comfy(first_frame), self._cv2frame2comfy(last_frame))
-
-    def extract_first_last_frame(self, 视频路径="", 视频=None) -> Tuple[torch.Tensor, torch.Tensor]:
-        """主执行函数：全类型兼容+全链路异常兜底"""
-        # 优先级判断：视频路径有效则优先使用
-        try:
-            if 视频路径 and os.path.exists(视频路径) and 视频路径.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv')):
-                print("✅ 检测到有效视频路径，优先使用路径读取")
-                return self._process_video_path(视频路径)
-        except Exception as e:
-            print(f"⚠️ 视频路径处理失败：{str(e)}，尝试使用视频输入端口数据")
-        
-        # 视频路径无效/不存在，使用视频输入端口数据
-        try:
-            # 检查视频输入端口是否有数据
-            if 视频 is None:
-                raise Exception("视频输入端口无数据且视频路径无效")
-            
-            # 情况1：直接传入ndarray帧序列
-            if isinstance(视频, np.ndarray):
-                if len(视频.shape) == 3 and 视频.shape[-1] == 3:
-                    视频 = np.expand_dims(视频, axis=0)
-                if len(视频.shape) == 4:
-                    first_frame = self._cv2frame2comfy(视频[0])
-                    last_frame = self._cv2frame2comfy(视频[-1])
-                    return (first_frame, last_frame)
-                else:
-                    raise Exception(f"ndarray帧维度错误，shape：{视频.shape}，预期4维(帧数,H,W,3)")
-
-            # 情况2：VideoFromComponents对象（核心：强化递归扫描）
-            video_type = str(type(视频))
-            if "VideoFromComponents" in video_type:
-                print("✅ 检测到VideoFromComponents，开始扫描属性并解析")
-                return self._extract_from_components(视频)
-
-            # 情况3：VideoFromFile对象（兼容原逻辑，修复IO异常）
-            elif "VideoFromFile" in video_type:
-                print("✅ 检测到VideoFromFile，使用CV2读取首尾帧")
-                video_path = self._get_video_path(视频)
-                if not video_path or not os.path.exists(video_path):
-                    raise Exception("无法从VideoFromFile获取有效视频路径")
-                # 双源获取总帧数
-                total_frames = 视频.get_frame_count() if (hasattr(视频, 'get_frame_count') and 视频.get_frame_count() > 0) else 0
-                if total_frames <= 0:
-                    cap = cv2.VideoCapture(video_path)
-                    total_frames = max(1, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
-                    cap.release()
-                # 读取首尾帧
-                first_frame = self._read_cv2_frame(video_path, 0)
-                last_frame = self._read_cv2_frame(video_path, max(0, total_frames - 1))
-                
-                if first_frame is None:
-                    raise Exception("无法读取VideoFromFile首帧")
-                if last_frame is None:
-                    raise Exception("无法读取VideoFromFile尾帧")
-                    
-                return (self._cv2frame2comfy(first_frame), self._cv2frame2comfy(last_frame))
-
-            # 情况4：不支持的类型
-            else:
-                raise Exception(f"不支持的视频类型：{video_type}，仅支持VideoFromFile/VideoFromComponents/ndarray")
-
-        # 捕获所有异常并统一抛出指定提示
-        except Exception as e:
-            raise Exception(f"无法获取首尾帧信息：{str(e)}")
-
-# 节点注册（与__init__.py保持一致）
-NODE_CLASS_MAPPINGS = {
-    "VideoFrameExtractNode": VideoFrameExtractNode
-}
-NODE_DISPLAY_NAME_MAPPINGS = {
-    "VideoFrameExtractNode": "视频首尾帧获取"
+"""
+👻幻影工具 - 视频首尾帧获取节点
+最终修复版：兼容VideoFromFile/VideoFromComponents，优先调用官方方法获取帧，解决无有效帧数据异常
+路径读取复用句柄池（video_capture_pool），单次打开完成探测与首尾帧读取
+首尾帧结果走两级缓存（video_frame_cache），重复执行同一视频无需重新解码
+校验输入时即开始后台预取首尾帧（video_prefetch），执行时只需等待预取完成
+包装BytesIO等内存数据的视频对象由PyAV直接从内存解码（video_stream_decode）
+"""
+import numpy as np
+import torch
+import os
+import re
+import warnings
+from typing import List, Tuple
+
+from .video_capture_pool import CAPTURE_POOL, get_file_key
+from .video_frame_cache import FRAME_CACHE
+from .frame_convert import frames_to_image, resize_frame, select_tensor_frames, tensor_to_image
+from .video_frame_access import LazyFrameSequence
+from .video_prefetch import PREFETCHER
+from .video_source_registry import VideoSourceAdapter, is_video_path, resolve_video_adapter
+from .video_shot_detect import DEFAULT_THRESHOLD, detect_shot_boundaries
+from .video_stream_decode import StreamVideoDecoder
+
+# 忽略无关警告，避免日志刷屏
+warnings.filterwarnings("ignore")
+
+NO_RESIZE = (0, 1.0)  # (输出最长边, 输出缩放比例)：不缩小
+
+class VideoFrameExtractNode:
+    # 节点核心配置
+    CATEGORY = "👻幻影工具"
+    FUNCTION = "extract_first_last_frame"
+    RETURN_TYPES = ("IMAGE", "IMAGE", "IMAGE")
+    RETURN_NAMES = ("首帧图像", "尾帧图像", "采样帧序列")
+    MAX_SAMPLE_FRAMES = 512  # 采样模式单次最多返回帧数，避免长视频占满内存
+    OUTPUT_NODE = True  # 支持预览
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "视频路径": ("STRING", {
+                    "default": "",
+                    "tooltip": "可选-视频文件路径（优先级高于视频输入端口），支持mp4/avi/mov/mkv/flv格式"
+                })
+            },
+            "optional": {
+                "视频": ("*", {
+                    "forceInput": False,
+                    "tooltip": "可选连-ComfyUI视频对象（VideoFromFile/VideoFromComponents/ndarray或tensor帧序列）"
+                }),
+                "采样模式": (["关闭", "索引列表", "间隔N帧", "均匀N帧", "时间戳(秒)", "镜头切换"], {
+                    "default": "关闭",
+                    "tooltip": "多帧采样：关闭时采样帧序列输出首尾帧批次；开启后按采样参数输出[B,H,W,3]批次；镜头切换输出每个镜头的首帧"
+                }),
+                "采样参数": ("STRING", {
+                    "default": "",
+                    "tooltip": "索引列表：0,10,-1（负数从末尾计）| 间隔N帧：N | 均匀N帧：N | 时间戳(秒)：0.5,1.2,3 | "
+                               "镜头切换：阈值,跳帧k（如0.4,2，阈值0-1越小越灵敏，每k帧检测一帧，其余只解码不取出；留空为0.4,1）"
+                }),
+                "输出精度": (["float32", "float16", "uint8"], {
+                    "default": "float32",
+                    "tooltip": "float32为ComfyUI标准IMAGE；float16内存减半；uint8输出0-255原始像素值（供支持整型输入的下游节点使用）"
+                }),
+                "输出最长边": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 16384,
+                    "step": 8,
+                    "tooltip": "缩小输出：限制输出最长边像素（0为不限制），在uint8帧上面积插值后再归一化"
+                }),
+                "输出缩放比例": ("FLOAT", {
+                    "default": 1.0,
+                    "min": 0.01,
+                    "max": 1.0,
+                    "step": 0.01,
+                    "tooltip": "缩小输出：按比例缩小（1.0为原尺寸），与最长边同时设置时取更小结果"
+                })
+            }
+        }
+
+    @classmethod
+    def _schedule_prefetch(cls, video_path: str):
+        """有效路径且首帧尚未缓存时，提交后台预取（打开视频、解码首尾帧）"""
+        if not is_video_path(video_path):
+            return None
+        file_key = get_file_key(video_path)
+        if not FRAME_CACHE.has_frame(file_key, 0):
+            if PREFETCHER.schedule(file_key, lambda: cls()._read_first_last(video_path)):
+                print(f"ℹ️ 已开始后台预取首尾帧：{os.path.basename(video_path)}")
+        return file_key
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, 视频路径=""):
+        # 入队校验时路径已知，提前开始解码；预取失败不影响校验结果
+        try:
+            cls._schedule_prefetch(视频路径)
+        except Exception:
+            pass
+        return True
+
+    @classmethod
+    def IS_CHANGED(cls, 视频路径="", **kwargs):
+        # 返回文件指纹：同一路径的视频文件被替换/修改后重新执行；同时补充提交预取
+        try:
+            file_key = cls._schedule_prefetch(视频路径)
+        except Exception:
+            return ""
+        return repr(file_key) if file_key else ""
+
+    def _cv2frame2comfy(self, frame: np.ndarray, dtype_name: str = "float32", resize: Tuple[int, float] = NO_RESIZE) -> torch.Tensor:
+        """cv2帧转ComfyUI IMAGE格式（默认float32/0-1/[1,H,W,3]），单次融合转换无中间临时数组；resize为(最长边, 缩放比例)"""
+        if frame is None or frame.size == 0:
+            raise Exception("无法获取有效帧数据")
+        return frames_to_image([frame], dtype_name, max_side=resize[0], scale=resize[1])
+
+    def _cv2frames2comfy(self, frames: List[np.ndarray], dtype_name: str = "float32", resize: Tuple[int, float] = NO_RESIZE) -> torch.Tensor:
+        """多帧整批转换为[B,H,W,3]，先在uint8帧上缩小，再直接写入一次性分配的输出缓冲区"""
+        return frames_to_image(frames, dtype_name, max_side=resize[0], scale=resize[1])
+
+    def _read_cv2_frames(self, video_path: str, sample_mode: str, sample_param: str, total_frames: int = 0) -> List[np.ndarray]:
+        """CV2批量读取采样帧：解析帧序号后分段并行解码（并行线程数为1时同一会话内顺序解码），解码失败时关闭句柄重开重试一次"""
+        with CAPTURE_POOL.session(video_path) as session:
+            # 定位索引可用时以精确帧数为准
+            indexed = session.ensure_seek_index()
+            frame_count = total_frames if (total_frames > 0 and not indexed) else session.frame_count
+            fps = session.fps
+        # 采样参数错误直接提示，不当作读取失败重试
+        frame_indices = self._resolve_sample_indices(sample_mode, sample_param, frame_count, fps)
+        for retry in range(2):
+            try:
+                if CAPTURE_POOL.decode_workers <= 1 or len(frame_indices) < 2:
+                    with CAPTURE_POOL.session(video_path) as session:
+                        return session.read_frames(frame_indices)
+                # 多帧分段并行解码（探测用的句柄已归还，可被其中一段复用）
+                return CAPTURE_POOL.read_frames_parallel(video_path, frame_indices)
+            except Exception as e:
+                if retry == 1:
+                    raise Exception(f"重试后仍无法读取采样帧：{str(e)}")
+        return []
+
+    def _resolve_sample_indices(self, sample_mode: str, sample_param: str, frame_count: int, fps: float = 0.0) -> List[int]:
+        """按采样模式解析目标帧序号（保持请求顺序，越界帧丢弃）"""
+        values = [v for v in re.split(r"[,，;；\s]+", sample_param.strip()) if v]
+        if not values:
+            raise Exception(f"采样模式[{sample_mode}]需要填写采样参数")
+        try:
+            if sample_mode == "索引列表":
+                frame_indices = [int(float(v)) for v in values]
+                frame_indices = [idx + frame_count if idx < 0 else idx for idx in frame_indices]
+            elif sample_mode == "间隔N帧":
+                frame_indices = list(range(0, frame_count, max(1, int(float(values[0])))))
+            elif sample_mode == "均匀N帧":
+                sample_count = max(1, int(float(values[0])))
+                frame_indices = np.linspace(0, frame_count - 1, sample_count).round().astype(int).tolist()
+            elif sample_mode == "时间戳(秒)":
+                if fps <= 0:
+                    raise Exception("无法获取视频帧率，不支持按时间戳采样")
+                frame_indices = [int(round(float(v) * fps)) for v in values]
+            else:
+                raise Exception(f"未知采样模式：{sample_mode}")
+        except ValueError:
+            raise Exception(f"采样参数格式错误：{sample_param}")
+
+        frame_indices = [idx for idx in frame_indices if 0 <= idx < frame_count]
+        if not frame_indices:
+            raise Exception(f"采样参数未命中任何有效帧（总帧数{frame_count}）")
+        if len(frame_indices) > self.MAX_SAMPLE_FRAMES:
+            print(f"⚠️ 采样帧数{len(frame_indices)}超过上限，仅保留前{self.MAX_SAMPLE_FRAMES}帧")
+            frame_indices = frame_indices[:self.MAX_SAMPLE_FRAMES]
+        return frame_indices
+
+    def _parse_shot_param(self, sample_param: str) -> Tuple[float, int]:
+        """解析镜头切换参数"阈值,跳帧k"，留空使用默认值"""
+        values = [v for v in re.split(r"[,，;；\s]+", sample_param.strip()) if v]
+        try:
+            threshold = float(values[0]) if values else DEFAULT_THRESHOLD
+            step = max(1, int(float(values[1]))) if len(values) > 1 else 1
+        except ValueError:
+            raise Exception(f"镜头切换参数格式错误：{sample_param}，应为 阈值,跳帧k")
+        return threshold, step
+
+    def _detect_sequence_shots(self, video_frames, sample_param: str) -> List[int]:
+        """内存帧序列的镜头切换检测：逐帧取用（tensor每次只转换一帧），返回各镜头首帧序号"""
+        threshold, step = self._parse_shot_param(sample_param)
+
+        def iter_frames():
+            for frame_idx in range(0, len(video_frames), step):
+                frame = video_frames[frame_idx]
+                if isinstance(frame, torch.Tensor):
+                    frame = frame.detach().cpu().numpy()
+                yield frame_idx, frame
+
+        boundaries = detect_shot_boundaries(iter_frames(), threshold, max_shots=self.MAX_SAMPLE_FRAMES)
+        print(f"✅ 镜头切换检测完成，共{len(boundaries)}个镜头")
+        return [frame_idx for frame_idx, _ in boundaries]
+
+    def _detect_decoded_shots(self, iter_frames, sample_param: str,
+                              resize: Tuple[int, float] = NO_RESIZE) -> List[np.ndarray]:
+        """解码器的镜头切换检测：iter_frames(step)单次顺序解码，仅保留各镜头首帧（已按输出尺寸缩小）"""
+        threshold, step = self._parse_shot_param(sample_param)
+        boundaries = detect_shot_boundaries(iter_frames(step), threshold,
+                                            keep=lambda frame: resize_frame(frame, *resize),
+                                            max_shots=self.MAX_SAMPLE_FRAMES)
+        if not boundaries:
+            raise Exception("镜头切换检测未读取到任何帧")
+        print(f"✅ 镜头切换检测完成，共{len(boundaries)}个镜头，首帧序号：{[idx for idx, _ in boundaries]}")
+        return [frame for _, frame in boundaries]
+
+    def _detect_video_path_shots(self, video_path: str, sample_param: str,
+                                 resize: Tuple[int, float] = NO_RESIZE) -> List[np.ndarray]:
+        """视频文件的镜头切换检测：跳过的帧只grab()不取出"""
+        with CAPTURE_POOL.session(video_path) as session:
+            return self._detect_decoded_shots(session.iter_frames, sample_param, resize)
+
+    def _sample_sequence(self, video_frames, sample_mode: str, sample_param: str,
+                         first_frame: torch.Tensor, last_frame: torch.Tensor, fps: float = 0.0,
+                         dtype_name: str = "float32", resize: Tuple[int, float] = NO_RESIZE) -> torch.Tensor:
+        """从内存帧序列中采样；关闭采样时返回首尾帧批次"""
+        if sample_mode == "关闭":
+            return torch.cat((first_frame, last_frame), dim=0)
+        if sample_mode == "镜头切换":
+            frame_indices = self._detect_sequence_shots(video_frames, sample_param)
+        else:
+            frame_indices = self._resolve_sample_indices(sample_mode, sample_param, len(video_frames), fps)
+        return self._cv2frames2comfy([video_frames[idx] for idx in frame_indices], dtype_name, resize)
+
+    def _sample_video_path(self, video_path: str, sample_mode: str, sample_param: str,
+                           first_frame: torch.Tensor, last_frame: torch.Tensor, total_frames: int = 0,
+                           dtype_name: str = "float32", resize: Tuple[int, float] = NO_RESIZE) -> torch.Tensor:
+        """从视频文件中采样（复用首尾帧读取时的池内句柄）；关闭采样时返回首尾帧批次"""
+        if sample_mode == "关闭":
+            return torch.cat((first_frame, last_frame), dim=0)
+        if sample_mode == "镜头切换":
+            return self._cv2frames2comfy(self._detect_video_path_shots(video_path, sample_param, resize), dtype_name)
+        frames = self._read_cv2_frames(video_path, sample_mode, sample_param, total_frames)
+        print(f"✅ 采样完成，共{len(frames)}帧")
+        return self._cv2frames2comfy(frames, dtype_name, resize)
+
+    def _extract_from_tensor(self, video_frames: torch.Tensor, sample_mode: str = "关闭", sample_param: str = "",
+                             dtype_name: str = "float32", fps: float = 0.0,
+                             resize: Tuple[int, float] = NO_RESIZE) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """torch.Tensor帧序列原生路径：[0:1]/[-1:]切片视图取首尾帧，ComfyUI IMAGE格式（浮点RGB/0-1）跳过颜色转换与归一化"""
+        if len(video_frames.shape) == 3 and video_frames.shape[-1] == 3:
+            video_frames = video_frames.unsqueeze(0)
+        if len(video_frames.shape) != 4 or video_frames.shape[0] == 0:
+            raise Exception(f"tensor帧维度错误，shape：{tuple(video_frames.shape)}，预期4维(帧数,H,W,3)")
+        first_frame = tensor_to_image(video_frames[0:1], dtype_name, *resize)
+        last_frame = tensor_to_image(video_frames[-1:], dtype_name, *resize)
+        if sample_mode == "关闭":
+            sampled = torch.cat((first_frame, last_frame), dim=0)
+        else:
+            if sample_mode == "镜头切换":
+                frame_indices = self._detect_sequence_shots(video_frames, sample_param)
+            else:
+                frame_indices = self._resolve_sample_indices(sample_mode, sample_param, video_frames.shape[0], fps)
+            sampled = tensor_to_image(select_tensor_frames(video_frames, frame_indices), dtype_name, *resize)
+        return (first_frame, last_frame, sampled)
+
+    def _extract_from_components(self, comp_obj, adapter: VideoSourceAdapter, sample_mode: str = "关闭", sample_param: str = "",
+                                 dtype_name: str = "float32", resize: Tuple[int, float] = NO_RESIZE) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """从VideoFromComponents提取帧序列：适配器按类型缓存帧数据路径/逐帧接口，全链路兜底"""
+        video_frames = None
+
+        # ====================== 第一步：通过适配器调用官方方法获取帧 ======================
+        try:
+            # 1. 获取总帧数，验证视频有效性
+            total_frames = adapter.get_frame_count(comp_obj)
+            if total_frames <= 0:
+                raise Exception("VideoFromComponents返回总帧数为0")
+
+            # 2. 帧数据路径（如get_components().images）按类型解析一次，后续直接取用
+            video_frames = adapter.get_frames(comp_obj)
+
+            # 3. 兜底：按需取帧（get_frame标准接口优先，其次__getitem__），只读取首尾/采样所需帧
+            if video_frames is None:
+                accessor = adapter.get_frame_accessor(comp_obj)
+                if accessor is not None:
+                    print("⚠️ 未从components提取到帧，尝试逐帧接口按需读取")
+                    lazy_frames = LazyFrameSequence(accessor, total_frames)
+                    try:
+                        lazy_frames[0]
+                    except Exception:
+                        raise Exception("逐帧接口按需读取无有效数据")
+                    video_frames = lazy_frames
+
+        except Exception as e:
+            raise Exception(f"调用官方方法失败：{str(e)}")
+
+        # ====================== 第二步：校验与解析 ======================
+        if video_frames is None:
+            raise Exception("VideoFromComponents对象无有效帧数据，可通过register_video_adapter为该类型注册适配器")
+
+        # 格式转换与维度校验
+        try:
+            fps = adapter.get_frame_rate(comp_obj)
+            # tensor帧序列走原生路径：切片取帧，不整段转换为ndarray
+            if isinstance(video_frames, torch.Tensor):
+                return self._extract_from_tensor(video_frames, sample_mode, sample_param, dtype_name, fps, resize)
+            # 按需取帧序列无需维度整理，直接读取首尾/采样帧
+            if not isinstance(video_frames, LazyFrameSequence):
+                # 3维单帧自动补为4维多帧
+                if len(video_frames.shape) == 3 and video_frames.shape[-1] == 3:
+                    video_frames = np.expand_dims(video_frames, axis=0)
+                    print(f"⚠️ 单帧自动补为4维，新shape：{video_frames.shape}")
+                # 必须是4维帧序列（帧数,H,W,3）
+                if len(video_frames.shape) != 4:
+                    raise Exception(f"帧序列维度错误！预期4维(帧数,H,W,3)，实际{len(video_frames.shape)}维，shape：{video_frames.shape}")
+            # 提取首尾帧
+            first_frame = self._cv2frame2comfy(video_frames[0], dtype_name, resize)
+            last_frame = self._cv2frame2comfy(video_frames[-1], dtype_name, resize)
+            sampled = self._sample_sequence(video_frames, sample_mode, sample_param, first_frame, last_frame, fps, dtype_name, resize)
+            return (first_frame, last_frame, sampled)
+        except Exception as e:
+            raise Exception(f"帧序列解析失败：{str(e)}")
+
+    def _read_first_last(self, video_path: str, total_frames: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """读取首帧与尾帧：并行线程数大于1时首帧在解码线程池、尾帧在当前线程各用一个句柄同时解码"""
+        def read_first():
+            with CAPTURE_POOL.session(video_path) as session:
+                return session.read_frame(0)
+
+        def read_last():
+            with CAPTURE_POOL.session(video_path) as session:
+                return session.read_tail_frame(total_frames)[1]
+
+        if CAPTURE_POOL.decode_workers <= 1:
+            with CAPTURE_POOL.session(video_path) as session:
+                return session.read_frame(0), session.read_tail_frame(total_frames)[1]
+        first_future = CAPTURE_POOL.submit(read_first)
+        last_frame = read_last()
+        return first_future.result(), last_frame
+
+    def _extract_from_stream(self, stream, sample_mode: str = "关闭", sample_param: str = "", dtype_name: str = "float32",
+                             resize: Tuple[int, float] = NO_RESIZE) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """内存视频流（BytesIO/bytes）：PyAV直接从内存解码首尾帧与采样帧，不写临时文件；
+        缩小输出由解码器在颜色转换时完成，后续转换不再缩小"""
+        with StreamVideoDecoder(stream, *resize) as decoder:
+            last_idx = decoder.frame_count - 1
+            frame_indices = []
+            if sample_mode not in ("关闭", "镜头切换"):
+                frame_indices = self._resolve_sample_indices(sample_mode, sample_param, decoder.frame_count, decoder.fps)
+            # 首尾帧与采样帧一次按序解码
+            frames = decoder.read_frames([0, last_idx] + frame_indices)
+            first_frame = self._cv2frame2comfy(frames[0], dtype_name)
+            last_frame = self._cv2frame2comfy(frames[1], dtype_name)
+            if sample_mode == "关闭":
+                sampled = torch.cat((first_frame, last_frame), dim=0)
+            elif sample_mode == "镜头切换":
+                sampled = self._cv2frames2comfy(self._detect_decoded_shots(decoder.iter_frames, sample_param), dtype_name)
+            else:
+                sampled = self._cv2frames2comfy(frames[2:], dtype_name)
+        print(f"✅ 内存视频流解码完成 | 总帧数：{decoder.frame_count}")
+        return (first_frame, last_frame, sampled)
+
+    def _process_video_path(self, video_path: str, total_frames: int = 0, dtype_name: str = "float32",
+                            resize: Tuple[int, float] = NO_RESIZE) -> Tuple[torch.Tensor, torch.Tensor]:
+        """处理视频路径输入：同一读取会话内完成探测、首帧读取与尾帧定位"""
+        if not video_path or not os.path.exists(video_path):
+            raise Exception("视频路径无效或不存在")
+        if not video_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv')):
+            raise Exception("不支持的视频格式，仅支持mp4/avi/mov/mkv/flv")
+
+        # 缓存查询：帧序号-1代表按会话探测帧数定位的尾帧
+        file_key = get_file_key(video_path)
+        tail_idx = total_frames - 1 if total_frames > 0 else -1
+        # 缩小输出时缓存中保存的是已缩小的帧，以尺寸设置区分
+        size_tag = f"{resize[0]}@{resize[1]:g}" if resize != NO_RESIZE else ""
+        convert = lambda frame: self._cv2frame2comfy(frame, dtype_name)
+        cached_first = FRAME_CACHE.get(file_key, 0, dtype_name, convert, size_tag)
+        cached_last = FRAME_CACHE.get(file_key, tail_idx, dtype_name, convert, size_tag)
+        if cached_first is not None and cached_last is not None:
+            PREFETCHER.discard(file_key)  # 不再需要预取结果，释放其持有的帧
+            print(f"✅ 首尾帧缓存命中 | {FRAME_CACHE.format_stats()}")
+            return (cached_first, cached_last)
+
+        # 读取首尾帧（total_frames<=0时使用会话探测到的总帧数）；已有后台预取任务时等待其结果
+        first_frame, last_frame = None, None
+        prefetched = None
+        if total_frames <= 0:
+            prefetched = PREFETCHER.take(file_key)
+        else:
+            PREFETCHER.discard(file_key)  # 预取按探测帧数读取尾帧，与指定总帧数不一致，不使用
+        if prefetched is not None:
+            first_frame, last_frame = prefetched
+            print("✅ 使用后台预取的首尾帧")
+        else:
+            for retry in range(2):
+                try:
+                    first_frame, last_frame = self._read_first_last(video_path, total_frames)
+                    break
+                except Exception as e:
+                    if retry == 1:
+                        raise Exception(f"重试后仍无法读取首尾帧：{str(e)}")
+
+        if first_frame is None:
+            raise Exception("无法读取视频首帧")
+        if last_frame is None:
+            raise Exception("无法读取视频尾帧")
+
+        # 在uint8帧上缩小后再归一化，缓存保存缩小后的帧
+        first_frame = resize_frame(first_frame, *resize)
+        last_frame = resize_frame(last_frame, *resize)
+        first_tensor = self._cv2frame2comfy(first_frame, dtype_name)
+        last_tensor = self._cv2frame2comfy(last_frame, dtype_name)
+        FRAME_CACHE.put(file_key, 0, dtype_name, first_frame, first_tensor, size_tag)
+        FRAME_CACHE.put(file_key, tail_idx, dtype_name, last_frame, last_tensor, size_tag)
+        print(f"ℹ️ 帧缓存 | {FRAME_CACHE.format_stats()}")
+        return (first_tensor, last_tensor)
+
+    def extract_first_last_frame(self, 视频路径="", 视频=None, 采样模式="关闭", 采样参数="",
+                                 输出精度="float32", 输出最长边=0, 输出缩放比例=1.0) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """主执行函数：全类型兼容+全链路异常兜底"""
+        resize = (int(输出最长边), float(输出缩放比例))
+        # 优先级判断：视频路径有效则优先使用
+        path_frames = None
+        try:
+            if 视频路径 and os.path.exists(视频路径) and 视频路径.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv')):
+                print("✅ 检测到有效视频路径，优先使用路径读取")
+                path_frames = self._process_video_path(视频路径, dtype_name=输出精度, resize=resize)
+        except Exception as e:
+            print(f"⚠️ 视频路径处理失败：{str(e)}，尝试使用视频输入端口数据")
+
+        # 路径可读时采样出错（如采样参数格式错误）直接提示，不退回视频输入端口
+        if path_frames is not None:
+            first_frame, last_frame = path_frames
+            try:
+                sampled = self._sample_video_path(视频路径, 采样模式, 采样参数, first_frame, last_frame,
+                                                  dtype_name=输出精度, resize=resize)
+            except Exception as e:
+                raise Exception(f"无法获取首尾帧信息：{str(e)}")
+            return (first_frame, last_frame, sampled)
+        
+        # 视频路径无效/不存在，使用视频输入端口数据
+        try:
+            # 检查视频输入端口是否有数据
+            if 视频 is None:
+                raise Exception("视频输入端口无数据且视频路径无效")
+            
+            # 情况1：直接传入ndarray帧序列
+            if isinstance(视频, np.ndarray):
+                if len(视频.shape) == 3 and 视频.shape[-1] == 3:
+                    视频 = np.expand_dims(视频, axis=0)
+                if len(视频.shape) == 4:
+                    first_frame = self._cv2frame2comfy(视频[0], 输出精度, resize)
+                    last_frame = self._cv2frame2comfy(视频[-1], 输出精度, resize)
+                    sampled = self._sample_sequence(视频, 采样模式, 采样参数, first_frame, last_frame,
+                                                    dtype_name=输出精度, resize=resize)
+                    return (first_frame, last_frame, sampled)
+                else:
+                    raise Exception(f"ndarray帧维度错误，shape：{视频.shape}，预期4维(帧数,H,W,3)")
+
+            # 情况2：直接传入torch.Tensor帧序列（如ComfyUI IMAGE批次），切片视图零拷贝取帧
+            if isinstance(视频, torch.Tensor):
+                return self._extract_from_tensor(视频, 采样模式, 采样参数, 输出精度, resize=resize)
+
+            # 按具体类型查找视频源适配器（访问方式按类型缓存）
+            adapter = resolve_video_adapter(视频)
+            video_type = str(type(视频))
+
+            # 情况3：VideoFromComponents类对象（内存帧数据）
+            if adapter is not None and adapter.kind == "components":
+                print("✅ 检测到VideoFromComponents，开始解析帧数据")
+                return self._extract_from_components(视频, adapter, 采样模式, 采样参数, 输出精度, resize)
+
+            # 情况4：VideoFromFile类对象（兼容原逻辑，修复IO异常）
+            elif adapter is not None and adapter.kind == "file":
+                print("✅ 检测到VideoFromFile，使用CV2读取首尾帧")
+                video_path = adapter.get_path(视频)
+                if not video_path or not os.path.exists(video_path):
+                    # 无磁盘路径：包装BytesIO等内存数据时直接从内存解码
+                    stream = adapter.get_stream(视频)
+                    if stream is not None:
+                        print("✅ VideoFromFile为内存视频流，使用PyAV直接解码")
+                        return self._extract_from_stream(stream, 采样模式, 采样参数, 输出精度, resize)
+                    raise Exception("无法从VideoFromFile获取有效视频路径")
+                # 优先使用对象提供的总帧数，否则由读取会话探测
+                total_frames = adapter.get_frame_count(视频)
+                first_frame, last_frame = self._process_video_path(video_path, total_frames, 输出精度, resize)
+                sampled = self._sample_video_path(video_path, 采样模式, 采样参数, first_frame, last_frame,
+                                                  total_frames, 输出精度, resize)
+                return (first_frame, last_frame, sampled)
+
+            # 情况5：不支持的类型
+            else:
+                raise Exception(f"不支持的视频类型：{video_type}，仅支持VideoFromFile/VideoFromComponents/ndarray/tensor")
+
+        # 捕获所有异常并统一抛出指定提示
+        except Exception as e:
+            raise Exception(f"无法获取首尾帧信息：{str(e)}")
+
+# 节点注册（与__init__.py保持一致）
+NODE_CLASS_MAPPINGS = {
+    "VideoFrameExtractNode": VideoFrameExtractNode
+}
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "VideoFrameExtractNode": "视频首尾帧获取"
 }
\ No newline at end of file
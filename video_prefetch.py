@@ -0,0 +1,60 @@
+"""
+👻幻影工具 - 视频首尾帧后台预取
+节点校验输入（VALIDATE_INPUTS/IS_CHANGED）时即在后台线程打开视频并解码首尾帧，
+执行时只需等待对应任务完成，解码耗时与上游节点的执行重叠
+预取队列有上限，新路径到来时取消最早的未开始任务；执行时任务仍在排队则取消并直接解码，不等待排在前面的其他视频
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+
+class FramePrefetcher:
+    """按文件指纹管理的预取任务队列：单线程顺序执行，最多保留max_pending个任务/结果"""
+
+    def __init__(self, max_pending: int = 4):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="phantom-prefetch")
+        self._futures = OrderedDict()  # file_key -> Future
+        self._lock = threading.Lock()
+
+    def schedule(self, file_key: Tuple[str, int, int], task: Callable[[], object]) -> bool:
+        """提交预取任务；同一文件已有任务时忽略，返回是否新提交"""
+        with self._lock:
+            if file_key in self._futures:
+                self._futures.move_to_end(file_key)
+                return False
+            # 同一路径但指纹不同：文件已变化，旧任务作废
+            for key in [k for k in self._futures if k[0] == file_key[0]]:
+                self._futures.pop(key).cancel()
+            self._futures[file_key] = self._executor.submit(task)
+            while len(self._futures) > self.max_pending:
+                # 超出上限：丢弃最早的任务，未开始的直接取消（已在解码的任务无法中断，完成后结果丢弃）
+                _, oldest = self._futures.popitem(last=False)
+                oldest.cancel()
+        return True
+
+    def discard(self, file_key: Tuple[str, int, int]):
+        """不再需要的预取任务（如执行时首尾帧已命中缓存）：未开始的取消，已完成的结果立即释放"""
+        with self._lock:
+            future = self._futures.pop(file_key, None)
+        if future is not None:
+            future.cancel()
+
+    def take(self, file_key: Tuple[str, int, int], timeout: Optional[float] = None):
+        """取出预取结果：任务已在执行时等待其完成；无任务、尚未开始（取消后由调用方直接解码，
+        避免排在其他视频的预取之后）、已取消或预取失败时返回None"""
+        with self._lock:
+            future: Optional[Future] = self._futures.pop(file_key, None)
+        if future is None or future.cancel() or future.cancelled():
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            print(f"⚠️ 后台预取失败：{str(e)}，改为执行时读取")
+            return None
+
+
+# 进程级共享预取队列
+PREFETCHER = FramePrefetcher()
@@ -0,0 +1,179 @@
+"""
+👻幻影工具 - 视频定位索引
+精确探测总帧数/帧率/时长/关键帧位置，并按文件指纹持久化，后续尾帧读取只需解码一个GOP
+优先使用PyAV仅解复用数据包（不解码）建立索引，未安装时退回CV2尾部扫描
+PyAV索引需读取整个文件（IO与文件大小成正比），在后台线程建立，不占用节点执行时间；建立完成前读取方按容器帧数回退读取尾帧
+"""
+import os
+import json
+import queue
+import hashlib
+import threading
+from typing import Optional, Tuple
+
+import cv2
+
+# 可选依赖：PyAV（用于无解码的关键帧索引），未安装时使用CV2兜底
+AV_AVAILABLE = False
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    pass
+
+INDEX_VERSION = 1
+
+
+def _default_index_dir() -> str:
+    plugin_root = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(plugin_root, "cache", "seek_index")
+
+
+def demux_video_pts(container, stream) -> Tuple[list, list]:
+    """遍历视频流数据包（不解码），返回按显示顺序排序的帧时间戳与关键帧时间戳"""
+    pts_list, keyframe_pts = [], []
+    for packet in container.demux(stream):
+        if packet.pts is None:
+            continue  # 冲刷包/无时间戳包不对应显示帧
+        pts_list.append(packet.pts)
+        if packet.is_keyframe:
+            keyframe_pts.append(packet.pts)
+    if not pts_list:
+        raise Exception("PyAV未解析到任何视频帧")
+    return sorted(pts_list), sorted(keyframe_pts)
+
+
+def _probe_with_av(video_path: str) -> dict:
+    """PyAV探测：遍历视频流数据包（不解码），按显示时间戳排序得到帧序号与关键帧位置"""
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        pts_list, keyframe_pts = demux_video_pts(container, stream)
+        pts_rank = {pts: idx for idx, pts in enumerate(pts_list)}
+        keyframes = sorted(pts_rank[pts] for pts in keyframe_pts)
+
+        fps = float(stream.average_rate) if stream.average_rate else 0.0
+        if stream.duration and stream.time_base:
+            duration = float(stream.duration * stream.time_base)
+        elif container.duration:
+            duration = container.duration / av.time_base
+        else:
+            duration = len(pts_list) / fps if fps > 0 else 0.0
+    return {"frame_count": len(pts_list), "fps": fps, "duration": duration,
+            "keyframes": keyframes, "source": "pyav"}
+
+
+def _probe_with_cv2(cap, estimated_count: int, fps: float, scan_window: int) -> dict:
+    """CV2兜底探测：从估计尾部回退一个窗口后顺序grab()到末尾，得到精确总帧数（关键帧未知）"""
+    start = max(0, estimated_count - 1 - scan_window)
+    while True:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        grabbed = 0
+        while cap.grab():
+            grabbed += 1
+        if grabbed > 0 or start == 0:
+            break
+        # 容器帧数严重偏大，定位已越过真实末尾，继续向前回退
+        start = max(0, start - scan_window * 4)
+    frame_count = start + grabbed
+    if frame_count <= 0:
+        raise Exception("CV2未读取到任何视频帧")
+    return {"frame_count": frame_count, "fps": fps,
+            "duration": frame_count / fps if fps > 0 else 0.0,
+            "keyframes": [], "source": "cv2"}
+
+
+def probe_seek_index(video_path: str, cap, estimated_count: int, fps: float, scan_window: int) -> dict:
+    """在当前线程探测定位索引：CV2尾部扫描（只读取尾部一个窗口，会移动cap读取位置），
+    用于PyAV不可用或后台建立失败的文件"""
+    return _probe_with_cv2(cap, estimated_count, fps, scan_window)
+
+
+class SeekIndexStore:
+    """定位索引存储：进程内字典+磁盘JSON，按文件指纹区分，文件变化后自动失效"""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _index_path(self, file_key: Tuple[str, int, int]) -> str:
+        digest = hashlib.sha1(repr(file_key).encode("utf-8")).hexdigest()
+        return os.path.join(self.index_dir, f"{digest}.json")
+
+    def get(self, file_key: Tuple[str, int, int]) -> Optional[dict]:
+        with self._lock:
+            index = self._memory.get(file_key)
+        if index is not None:
+            return index
+        try:
+            with open(self._index_path(file_key), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get("version") != INDEX_VERSION or tuple(index.get("file_key", ())) != tuple(file_key):
+            return None
+        with self._lock:
+            self._memory[file_key] = index
+        return index
+
+    def put(self, file_key: Tuple[str, int, int], index: dict):
+        index = dict(index, version=INDEX_VERSION, file_key=list(file_key))
+        with self._lock:
+            self._memory[file_key] = index
+        path = self._index_path(file_key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 定位索引写入失败：{str(e)}")
+
+
+class SeekIndexBuilder:
+    """后台建立PyAV定位索引：单个守护线程按提交顺序解复用，同一文件只提交一次，结果写入索引存储"""
+
+    def __init__(self, store: SeekIndexStore):
+        self.store = store
+        self._submitted = set()
+        self._failed = set()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, video_path: str, file_key: Tuple[str, int, int]) -> bool:
+        """提交后台建立任务，返回索引是否会由后台建立（PyAV不可用或该文件已建立失败时返回False，由调用方自行探测）"""
+        if not AV_AVAILABLE:
+            return False
+        with self._lock:
+            if file_key in self._failed:
+                return False
+            if file_key in self._submitted:
+                return True
+            self._submitted.add(file_key)
+            if self._thread is None:
+                # 守护线程：进程退出时不等待未完成的解复用
+                self._thread = threading.Thread(target=self._run, name="phantom-seek-index", daemon=True)
+                self._thread.start()
+        self._queue.put((video_path, file_key))
+        return True
+
+    def _run(self):
+        while True:
+            video_path, file_key = self._queue.get()
+            try:
+                index = _probe_with_av(video_path)
+            except Exception as e:
+                print(f"⚠️ PyAV建立定位索引失败：{str(e)}，改用CV2尾部扫描")
+                with self._lock:
+                    self._failed.add(file_key)
+                continue
+            self.store.put(file_key, index)
+            print(f"✅ 已在后台建立定位索引 | {os.path.basename(video_path)} | 总帧数：{index['frame_count']}"
+                  f" | 关键帧：{len(index['keyframes'])}个")
+
+
+# 进程级共享定位索引存储与后台建立线程
+SEEK_INDEX_STORE = SeekIndexStore(_default_index_dir())
+SEEK_INDEX_BUILDER = SeekIndexBuilder(SEEK_INDEX_STORE)
@@ -0,0 +1,51 @@
+"""
+👻幻影工具 - 镜头切换检测
+顺序读取帧，在缩小的代理帧上计算HSV颜色直方图，与上一帧的巴氏距离超过阈值即判定为新镜头
+只保留上一帧的直方图，内存占用与视频长度无关；输出每个镜头的首帧
+"""
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+PROXY_SIZE = (64, 36)  # 代理帧尺寸(宽,高)，只用于计算直方图
+HIST_BINS = (16, 16)  # H/S通道直方图分箱数
+DEFAULT_THRESHOLD = 0.4
+
+
+def _proxy_hist(frame: np.ndarray) -> np.ndarray:
+    """整帧缩小为代理帧后计算归一化颜色直方图（灰度帧使用亮度直方图）"""
+    if frame.dtype == np.float16:
+        frame = frame.astype(np.float32)
+    proxy = cv2.resize(frame, PROXY_SIZE, interpolation=cv2.INTER_AREA)
+    if proxy.dtype != np.uint8:
+        # 浮点帧按ComfyUI IMAGE（0-1）处理，代理帧很小，转换开销可忽略
+        proxy = (np.clip(proxy, 0.0, 1.0) * 255.0).astype(np.uint8)
+    if proxy.ndim == 3 and proxy.shape[-1] >= 3:
+        hsv = cv2.cvtColor(np.ascontiguousarray(proxy[..., :3]), cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, list(HIST_BINS), [0, 180, 0, 256])
+    else:
+        hist = cv2.calcHist([proxy.reshape(proxy.shape[:2])], [0], None, [HIST_BINS[0] * HIST_BINS[1]], [0, 256])
+    return cv2.normalize(hist, hist, alpha=1.0, norm_type=cv2.NORM_L1)
+
+
+def detect_shot_boundaries(frames: Iterable[Tuple[int, np.ndarray]], threshold: float = DEFAULT_THRESHOLD,
+                           keep: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                           max_shots: int = 0) -> List[Tuple[int, Optional[np.ndarray]]]:
+    """流式检测镜头切换，返回[(镜头首帧序号, 帧数据或None)]，首帧始终作为第一个镜头
+
+    frames为(帧序号, 帧)迭代器，可以跳帧提供（跳帧时切换点精确到所提供的帧）；
+    keep不为None时对每个镜头首帧调用keep并保存其结果（如缩小后的帧），否则只返回序号；
+    max_shots>0时达到数量后停止读取。
+    """
+    boundaries = []
+    prev_hist = None
+    for frame_idx, frame in frames:
+        hist = _proxy_hist(frame)
+        if prev_hist is None or cv2.compareHist(prev_hist, hist, cv2.HISTCMP_BHATTACHARYYA) > threshold:
+            boundaries.append((frame_idx, keep(frame) if keep is not None else None))
+            if 0 < max_shots <= len(boundaries):
+                print(f"⚠️ 镜头数达到上限{max_shots}，停止检测")
+                break
+        prev_hist = hist
+    return boundaries
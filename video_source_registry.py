@@ -0,0 +1,213 @@
+"""
+👻幻影工具 - 视频源适配器注册表
+按视频对象的具体类型分派到适配器，路径/帧数据/逐帧接口的访问方式每个类型只解析一次并缓存，
+后续调用仅需一次字典查找，不再逐个dir()+getattr扫描属性（避免触发属性内的解码）
+其他插件可调用register_video_adapter为新的视频对象类型注册适配器
+"""
+import io
+import os
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+import torch
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.flv')
+
+
+def is_video_path(value) -> bool:
+    return isinstance(value, str) and value.lower().endswith(VIDEO_EXTENSIONS) and os.path.exists(value)
+
+
+def is_memory_video(value) -> bool:
+    """内存视频数据：非空bytes类对象，或可读可定位的文件对象（如BytesIO）"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value) > 0
+    return isinstance(value, io.IOBase) and value.readable() and value.seekable()
+
+
+def _is_frame_array(value) -> bool:
+    return isinstance(value, (np.ndarray, torch.Tensor)) and len(value.shape) == 4
+
+
+class VideoSourceAdapter:
+    """视频源适配器基类：kind为"file"（可取得视频文件路径）或"components"（内存帧数据）
+
+    插件可继承并覆盖对应方法后注册，未覆盖的方法返回空值，由节点走后续兜底逻辑
+    """
+    kind = "file"
+
+    def get_path(self, video_obj) -> Optional[str]:
+        """返回可由CV2读取的视频文件路径"""
+        return None
+
+    def get_stream(self, video_obj):
+        """返回内存视频数据（BytesIO等文件对象或bytes），无磁盘路径时由PyAV直接从内存解码"""
+        return None
+
+    def get_frames(self, video_obj):
+        """返回整段帧序列（[N,H,W,3] ndarray/tensor）"""
+        return None
+
+    def get_frame_accessor(self, video_obj) -> Optional[Callable[[int], object]]:
+        """返回按帧序号取单帧的可调用对象（用于按需取帧）"""
+        return None
+
+    def get_frame_count(self, video_obj) -> int:
+        try:
+            return int(video_obj.get_frame_count())
+        except Exception:
+            return 0
+
+    def get_frame_rate(self, video_obj) -> float:
+        try:
+            return float(video_obj.get_frame_rate())
+        except Exception:
+            return 0.0
+
+
+class FileVideoAdapter(VideoSourceAdapter):
+    """VideoFromFile类适配器：get_stream_source()优先，其次实例字典中保存视频源（路径或内存数据）的属性（按类型缓存属性名）"""
+    kind = "file"
+
+    def __init__(self):
+        self._source_attr = None  # 保存视频源的属性名；None为尚未找到（不缓存未命中，同类型其他实例可能持有视频源）
+
+    def _source_value(self, video_obj):
+        """实例字典中保存视频源的属性值：同一属性可能保存路径或BytesIO，属性名与当前值的类型无关"""
+        if self._source_attr is None and hasattr(video_obj, '__dict__'):
+            # 只查看实例字典（含私有属性），不会调用property；找到后每个类型不再扫描
+            self._source_attr = next((name for name, val in vars(video_obj).items()
+                                      if is_video_path(val) or is_memory_video(val)), None)
+        if self._source_attr is None:
+            return None
+        return getattr(video_obj, self._source_attr, None)
+
+    def get_path(self, video_obj) -> Optional[str]:
+        if hasattr(video_obj, 'get_stream_source'):
+            try:
+                src = video_obj.get_stream_source()
+                if is_video_path(src):
+                    return src
+            except Exception:
+                pass
+        val = self._source_value(video_obj)
+        return val if is_video_path(val) else None
+
+    def get_stream(self, video_obj):
+        if hasattr(video_obj, 'get_stream_source'):
+            try:
+                src = video_obj.get_stream_source()
+                if is_memory_video(src):
+                    return src
+            except Exception:
+                pass
+        val = self._source_value(video_obj)
+        return val if is_memory_video(val) else None
+
+
+class ComponentsVideoAdapter(VideoSourceAdapter):
+    """VideoFromComponents类适配器：get_components()中帧数据的属性路径按类型解析一次并缓存"""
+    kind = "components"
+    FRAME_ATTRS = ("images", "frames", "frame_data", "video_frames", "video_data", "tensor", "data")
+    MAX_DEPTH = 3
+
+    def __init__(self):
+        self._frames_path = None  # 属性路径，如(("attr", "images"),)；()表示未找到
+        self._accessor_name = None
+
+    @staticmethod
+    def _follow(obj, path):
+        for kind, name in path:
+            obj = obj[name] if kind == "key" else getattr(obj, name)
+        return obj
+
+    def _discover(self, obj, depth=0) -> Optional[tuple]:
+        """在已知帧属性名内递归查找帧数据，返回属性路径"""
+        if depth > self.MAX_DEPTH:
+            return None
+        if isinstance(obj, dict):
+            children = [(("key", k), v) for k, v in obj.items() if k in self.FRAME_ATTRS]
+        else:
+            children = []
+            for attr in self.FRAME_ATTRS:
+                try:
+                    if hasattr(obj, attr):
+                        children.append((("attr", attr), getattr(obj, attr)))
+                except Exception:
+                    continue
+        for step, val in children:
+            if _is_frame_array(val):
+                return (step,)
+            if isinstance(val, (str, int, float, bool)) or val is None:
+                continue
+            nested = self._discover(val, depth + 1)
+            if nested is not None:
+                return (step,) + nested
+        return None
+
+    def get_frames(self, video_obj):
+        try:
+            components = video_obj.get_components()
+        except Exception:
+            return None
+        if components is None:
+            return None
+        if _is_frame_array(components):
+            return components
+        if self._frames_path:
+            try:
+                frames = self._follow(components, self._frames_path)
+                if _is_frame_array(frames):
+                    return frames
+            except Exception:
+                pass
+        path = self._discover(components)
+        self._frames_path = path or ()
+        if path:
+            print(f"✅ 已解析帧数据属性路径：{'.'.join(name for _, name in path)}")
+            return self._follow(components, path)
+        return None
+
+    def get_frame_accessor(self, video_obj):
+        if self._accessor_name is None:
+            # 按类型确定逐帧接口：get_frame标准接口优先，其次__getitem__
+            self._accessor_name = next(
+                (name for name in ('get_frame', '__getitem__') if hasattr(type(video_obj), name)), "")
+        return getattr(video_obj, self._accessor_name) if self._accessor_name else None
+
+
+# 类名 -> 内置适配器类（未显式注册的类型按类名与继承链匹配，每个具体类型只匹配一次）
+_BUILTIN_ADAPTERS = {
+    "VideoFromComponents": ComponentsVideoAdapter,
+    "VideoFromFile": FileVideoAdapter,
+}
+_REGISTERED = {}  # 具体类型 -> 适配器（插件注册）
+_RESOLVED = {}  # 具体类型 -> 适配器或None（解析结果缓存）
+_lock = threading.Lock()
+
+
+def register_video_adapter(video_type: type, adapter: VideoSourceAdapter):
+    """为视频对象类型注册适配器（子类未单独注册时沿用父类适配器）"""
+    with _lock:
+        _REGISTERED[video_type] = adapter
+        _RESOLVED.clear()
+
+
+def resolve_video_adapter(video_obj) -> Optional[VideoSourceAdapter]:
+    """按具体类型查找适配器：命中缓存为一次字典查找，未命中时按注册表→内置类名解析并缓存"""
+    video_type = type(video_obj)
+    try:
+        return _RESOLVED[video_type]
+    except KeyError:
+        pass
+    adapter = None
+    for base in video_type.__mro__:
+        if base in _REGISTERED:
+            adapter = _REGISTERED[base]
+            break
+        if base.__name__ in _BUILTIN_ADAPTERS:
+            adapter = _BUILTIN_ADAPTERS[base.__name__]()
+            break
+    with _lock:
+        return _RESOLVED.setdefault(video_type, adapter)
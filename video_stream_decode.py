@@ -0,0 +1,158 @@
+"""
+👻幻影工具 - 内存视频流解码
+VideoFromFile包装BytesIO/bytes（上传、API传入的工作流）时，由PyAV直接从内存读取首尾帧/采样帧，不写临时文件
+BytesIO/bytes经memoryview只读访问，不复制整段视频数据，也不改变原对象的读取位置
+缩小输出在解码器颜色转换（swscale）时一并完成，不生成原尺寸BGR帧
+"""
+import io
+import bisect
+from typing import List
+
+import numpy as np
+
+from .frame_convert import target_size
+from .video_seek_index import AV_AVAILABLE, demux_video_pts
+
+if AV_AVAILABLE:
+    import av
+
+
+class MemoryStreamReader(io.RawIOBase):
+    """内存视频数据的只读文件对象：按需从memoryview切片，读取位置独立于原对象"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        # 只复制本次请求的数据块（交给FFmpeg的缓冲区），整段数据不复制
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return chunk
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()  # 解除导出，原BytesIO恢复可写
+        super().close()
+
+
+class StreamVideoDecoder:
+    """PyAV内存视频解码器：打开时解复用一遍（不解码）得到各帧显示时间戳与关键帧，读取指定帧只解码所在GOP"""
+
+    def __init__(self, source, max_side: int = 0, scale: float = 1.0):
+        if not AV_AVAILABLE:
+            raise Exception("内存视频流解码需要安装PyAV：pip install av")
+        self._source = source
+        self.max_side = max_side
+        self.scale = scale
+        self._restore_pos = None
+        if isinstance(source, io.BytesIO):
+            reader = MemoryStreamReader(source.getbuffer())
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            reader = MemoryStreamReader(source)
+        else:
+            # 其他文件对象直接读取，结束后恢复原读取位置
+            self._restore_pos = source.tell()
+            reader = source
+        self._reader = reader
+        self.container = None
+        try:
+            self.container = av.open(reader, mode="r")
+            self.stream = self.container.streams.video[0]
+            self.stream.thread_type = "AUTO"
+            self.pts_list, self.keyframe_pts = demux_video_pts(self.container, self.stream)
+        except Exception:
+            self.close()
+            raise
+        self.frame_count = len(self.pts_list)
+        self.fps = float(self.stream.average_rate) if self.stream.average_rate else 0.0
+        self._frames = None  # 当前解码迭代器
+        self._last_pts = None  # 最近解码帧的时间戳
+
+    def _to_bgr(self, frame) -> np.ndarray:
+        """解码帧转BGR uint8，需要缩小时在颜色转换中按面积插值直接输出目标尺寸"""
+        height, width = target_size(frame.height, frame.width, self.max_side, self.scale)
+        if (height, width) == (frame.height, frame.width):
+            return frame.to_ndarray(format="bgr24")
+        return frame.to_ndarray(format="bgr24", width=width, height=height, interpolation="AREA")
+
+    def _seek_keyframe(self, target_pts: int):
+        k = bisect.bisect_right(self.keyframe_pts, target_pts) - 1
+        keyframe_pts = self.keyframe_pts[k] if k >= 0 else self.pts_list[0]
+        self.container.seek(keyframe_pts, stream=self.stream, backward=True)
+        self._frames = self.container.decode(self.stream)
+        self._last_pts = None
+        return keyframe_pts
+
+    def read_frames(self, frame_indices: List[int]) -> List[np.ndarray]:
+        """按帧序号读取（BGR uint8，已按输出尺寸缩小）：升序解码，目标在当前位置之后且同一GOP内时继续顺序解码，否则定位到所在GOP关键帧"""
+        decoded = {}
+        tail_frame = None
+        for frame_idx in sorted(set(frame_indices)):
+            target_pts = self.pts_list[frame_idx]
+            k = bisect.bisect_right(self.keyframe_pts, target_pts) - 1
+            gop_start = self.keyframe_pts[k] if k >= 0 else self.pts_list[0]
+            if self._frames is None or self._last_pts is None or not (gop_start <= self._last_pts < target_pts):
+                self._seek_keyframe(target_pts)
+            frame = None
+            for candidate in self._frames:
+                if candidate.pts is None:
+                    continue
+                self._last_pts = candidate.pts
+                tail_frame = candidate
+                if candidate.pts >= target_pts:
+                    frame = candidate
+                    break
+            if frame is None:
+                # 解码到末尾仍未到达目标（时间戳不连续），使用实际尾帧
+                if tail_frame is None:
+                    raise Exception(f"读取帧{frame_idx}失败")
+                frame = tail_frame
+            decoded[frame_idx] = self._to_bgr(frame)
+        return [decoded[frame_idx] for frame_idx in frame_indices]
+
+    def iter_frames(self, step: int = 1):
+        """从首帧开始顺序解码，产出(帧序号, 帧)：每step帧转换一帧，其余帧只解码不转换"""
+        step = max(1, step)
+        self._seek_keyframe(self.pts_list[0])
+        for frame_idx, frame in enumerate(self._frames):
+            if frame_idx % step == 0:
+                yield frame_idx, self._to_bgr(frame)
+        self._frames = None
+
+    def close(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+        if isinstance(self._reader, MemoryStreamReader):
+            self._reader.close()
+        elif self._restore_pos is not None:
+            self._source.seek(self._restore_pos)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+